@@ -6,27 +6,168 @@ PocketFlow-based Gradio GUI for MBTI Personality Questionnaire - V2 with Auto-sa
 import sys
 import os
 import json
+import asyncio
 import gradio as gr
 from datetime import datetime
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from flow import create_mbti_flow, create_shared_store
+from flow import create_async_analysis_flow, create_report_flow, create_shared_store
 from utils.questionnaire import load_questionnaire, save_questionnaire
+from utils.mbti_scoring import IncrementalScorer
+from utils.adaptive import AdaptiveQuestionnaire
+from utils.question_sets import DIMENSION_PAIRS
+from utils.response_codec import encode_token
+
+# Length choice that asks from the 60-question bank until every dimension is settled
+ADAPTIVE_CHOICE = "Adaptive"
+
+
+class AnalysisJob:
+    """Scoring plus LLM analysis of one fixed set of responses, running as a background task"""
+
+    def __init__(self, questions, responses):
+        self.questions = list(questions)
+        self.responses = dict(responses)
+        self.chunks = []
+        self.version = 0  # bumped on every change to chunks, including a retry's reset
+        self.attached = False  # set once Analyze is showing this job
+        self.updated = asyncio.Event()
+
+        self.shared = create_shared_store({
+            "ui_mode": "gradio",
+            "output_format": "html",
+            "analysis_method": "both",  # Use both traditional and LLM
+            "save_report": False  # the report is shown from memory and written on download
+        })
+        self.shared["questionnaire"]["responses"] = self.responses
+        self.shared["questionnaire"]["questions"] = self.questions
+
+        self.loop = asyncio.get_running_loop()
+        self.task = self.loop.create_task(self._run())
+        # A superseded job's failure is never awaited; mark it retrieved so asyncio doesn't warn
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _run(self):
+        try:
+            await create_async_analysis_flow(on_chunk=self._on_chunk, with_report=False).run_async(self.shared)
+        finally:
+            self._notify()
+
+    def _on_chunk(self, chunk):
+        if chunk is None:
+            self.chunks = []  # a new attempt streams the analysis from the start
+        else:
+            self.chunks.append(chunk)
+        self.version += 1
+        self._notify()
+
+    def _notify(self):
+        # Wake every waiting stream(), then start a fresh event for the next update
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def matches(self, questions, responses):
+        """True if this job analyzes exactly these answers and has not failed or fallen back"""
+        if self.task.cancelled() or (self.task.done() and self.task.exception() is not None):
+            return False
+        if self.shared["analysis"].get("llm_fallback"):
+            # The full analysis may be cached by now, so let a new job fetch it
+            return False
+        return [q['id'] for q in questions] == [q['id'] for q in self.questions] and responses == self.responses
+
+    def cancel(self):
+        """Stop the job; safe to call from any thread.
+
+        Other callers coalesced onto the same LLM request are unaffected: a
+        cancelled single-flight leader hands the request over to a follower.
+        """
+        self.loop.call_soon_threadsafe(self.task.cancel)
+
+    async def stream(self):
+        """Yield the analysis text so far each time it grows, until the job finishes"""
+        seen = 0
+        while True:
+            updated = self.updated
+            if self.version != seen:
+                seen = self.version
+                yield "".join(self.chunks)
+            if self.task.done():
+                return
+            await updated.wait()
 
 
 class MBTIPocketFlowApp:
     def __init__(self):
         self.questions = load_questionnaire()
         self.responses = {}
+        self.scorer = IncrementalScorer(self.questions)  # running tally for the live preview
         self.shared = None
-        self.last_report_path = None
+        self.report = None  # utils.report_generator.Report of the last analysis
         self.questionnaire_length = 20
+        self.adaptive = None  # AdaptiveQuestionnaire when the Adaptive length is chosen
+        # Speculative mode starts the LLM analysis as soon as the last answer is in
+        self.speculative = os.getenv("SPECULATIVE_ANALYSIS", "0").lower() in ("1", "true", "yes")
+        self.job = None
+
+    def discard_job(self):
+        """Drop the analysis job, cancelling it unless Analyze is already showing it"""
+        if self.job is not None:
+            if not self.job.attached:
+                print("DEBUG: Cancelling superseded speculative analysis")
+                self.job.cancel()
+            self.job = None
+
+    def update_speculation(self):
+        """Supersede a job whose answers changed, and start one when all questions are answered.
+
+        Must be called from the event loop (async handlers)."""
+        if self.job is not None and not self.job.matches(self.questions, self.responses):
+            self.discard_job()
+        if self.speculative and self.job is None and self.is_complete():
+            print("DEBUG: All questions answered, starting speculative analysis")
+            self.job = AnalysisJob(self.questions, self.responses)
+
+    async def set_speculative(self, enabled):
+        """Toggle speculative mode from the UI"""
+        self.speculative = enabled
+        if enabled:
+            self.update_speculation()
+        else:
+            self.discard_job()
+
+    def is_complete(self):
+        """All questions answered (and, in adaptive mode, every dimension settled)"""
+        if len(self.responses) != len(self.questions):
+            return False
+        return self.adaptive is None or self.adaptive.done
+
+    def start_session(self):
+        """Clear the answers; adaptive sessions start again from their first question"""
+        self.responses = {}
+        if self.questionnaire_length == ADAPTIVE_CHOICE:
+            self.adaptive = AdaptiveQuestionnaire()
+            self.questions = [self.adaptive.next_question()]
+            self.scorer = self.adaptive.scorer
+        else:
+            self.adaptive = None
+            self.scorer = IncrementalScorer(self.questions)
+        self.discard_job()
+
+    def extend_adaptive(self):
+        """In adaptive mode, append the next question once every asked one is answered"""
+        if self.adaptive is not None and len(self.responses) == len(self.questions):
+            question = self.adaptive.next_question()
+            if question is not None:
+                # A new list, so the question set registry sees a new set
+                self.questions = self.questions + [question]
 
     def get_question_text(self, question_idx):
         """Get current question text"""
         if 0 <= question_idx < len(self.questions):
             q = self.questions[question_idx]
+            if self.adaptive is not None:
+                return f"Question {question_idx + 1} (adaptive, at most {len(self.adaptive.bank)}): {q['text']}"
             return f"Question {question_idx + 1} of {len(self.questions)}: {q['text']}"
         return "All questions completed!"
 
@@ -37,13 +178,58 @@ class MBTIPocketFlowApp:
             return self.responses.get(q_id, 3)
         return 3
 
-    def navigate_question(self, question_idx, direction, current_response):
-        """Navigate to previous/next question and auto-save current response"""
-        # Auto-save current response before navigating
+    def record_response(self, question_idx, current_response):
+        """Save one answer and update the running tally; returns its question id (None if out of range)"""
         if 0 <= question_idx < len(self.questions):
             q_id = self.questions[question_idx]['id']
             self.responses[q_id] = current_response
+            if self.adaptive is not None:
+                self.adaptive.answer(q_id, current_response)  # updates self.scorer too
+            else:
+                self.scorer.set(q_id, current_response)
+            return q_id
+        return None
+
+    def render_live_preview(self):
+        """Provisional type and per-dimension bars from the answers so far"""
+        answered = self.scorer.answered
+        if not answered:
+            return "<div style='color: #888;'>Your provisional type will appear here as you answer.</div>"
+
+        scores = self.scorer.scores()
+        confidence = self.scorer.confidence()
+        bars = ""
+        for dim1, dim2 in DIMENSION_PAIRS:
+            share = scores[f'{dim1}_score'] * 100
+            bars += f"""
+                <div style="display: flex; align-items: center; gap: 8px; margin: 4px 0;">
+                    <span style="width: 4.5em; text-align: right;">{dim1} {share:.0f}%</span>
+                    <div style="flex: 1; height: 10px; background: #2196F3; border-radius: 5px; overflow: hidden;">
+                        <div style="width: {share:.1f}%; height: 100%; background: #4CAF50;"></div>
+                    </div>
+                    <span style="width: 4.5em;">{100 - share:.0f}% {dim2}</span>
+                    <span style="width: 8em; color: #888;">confidence {confidence[f'{dim1}{dim2}_confidence'] * 100:.0f}%</span>
+                </div>"""
+        if self.adaptive is not None:
+            answered_text = f"{answered} answered, stops once every dimension is settled"
+        else:
+            answered_text = f"{answered}/{len(self.questions)} answered"
+        return f"""
+            <div style="font-family: Arial, sans-serif;">
+                <strong>Provisional type: {self.scorer.mbti_type()}</strong>
+                <span style="color: #888;">({answered_text})</span>
+                {bars}
+            </div>
+            """
+
+    async def navigate_question(self, question_idx, direction, current_response):
+        """Navigate to previous/next question and auto-save current response"""
+        # Auto-save current response before navigating
+        q_id = self.record_response(question_idx, current_response)
+        if q_id is not None:
             print(f"DEBUG: Saved Q{q_id} = {current_response}")
+            self.extend_adaptive()
+            self.update_speculation()
 
         # Navigate
         if direction == "prev":
@@ -56,54 +242,54 @@ class MBTIPocketFlowApp:
 
         # Update button states
         prev_disabled = new_idx == 0
-        next_disabled = new_idx == len(self.questions) - 1
+        next_disabled = new_idx == len(self.questions) - 1 and (self.adaptive is None or self.adaptive.done)
 
         # Check if all questions answered (after saving current response)
-        all_answered = len(self.responses) == len(self.questions)
+        all_answered = self.is_complete()
         print(f"DEBUG: {len(self.responses)}/{len(self.questions)} answered, all_answered={all_answered}")
 
         return new_idx, question_text, new_response, gr.update(interactive=not prev_disabled), gr.update(
-            interactive=not next_disabled), gr.update(visible=all_answered)
+            interactive=not next_disabled), gr.update(visible=all_answered), self.render_live_preview()
 
     def change_questionnaire_length(self, length):
         """Change questionnaire length and reset"""
         from utils.questionnaire import get_questionnaire_by_length
 
         self.questionnaire_length = length
-        self.questions = get_questionnaire_by_length(length)
-        self.responses = {}  # Reset responses
+        if length != ADAPTIVE_CHOICE:
+            self.questions = get_questionnaire_by_length(length)
+        self.start_session()  # Reset responses
 
         # Return to first question
         question_text = self.get_question_text(0)
-        return 0, question_text, 3, gr.update(visible=False)
+        return 0, question_text, 3, gr.update(visible=False), self.render_live_preview()
 
-    def save_slider_response(self, question_idx, current_response):
-        """Save response when slider changes"""
-        if 0 <= question_idx < len(self.questions):
-            q_id = self.questions[question_idx]['id']
-            self.responses[q_id] = current_response
+    async def save_slider_response(self, question_idx, current_response):
+        """Save response when slider changes, refreshing the live preview"""
+        q_id = self.record_response(question_idx, current_response)
+        if q_id is not None:
             print(f"DEBUG: Slider saved Q{q_id} = {current_response}")
+            self.extend_adaptive()
+            self.update_speculation()
 
         # Check if all questions answered
-        all_answered = len(self.responses) == len(self.questions)
-        return gr.update(visible=all_answered)
+        all_answered = self.is_complete()
+        return gr.update(visible=all_answered), self.render_live_preview()
 
-    def run_pocketflow_analysis_with_save(self, question_idx, current_response):
+    async def run_pocketflow_analysis_with_save(self, question_idx, current_response):
         """Save current response then run analysis"""
         # Save current response before analysis
-        if 0 <= question_idx < len(self.questions):
-            q_id = self.questions[question_idx]['id']
-            self.responses[q_id] = current_response
+        self.record_response(question_idx, current_response)
 
-        # Run the analysis
-        return self.run_pocketflow_analysis()
+        # Run the analysis, passing streamed updates through
+        async for update in self.run_pocketflow_analysis():
+            yield update
 
     def save_current_questionnaire(self, question_idx=None, current_response=None):
         """Save current questionnaire state (even if incomplete)"""
         # Save current response if provided
-        if question_idx is not None and current_response is not None and 0 <= question_idx < len(self.questions):
-            q_id = self.questions[question_idx]['id']
-            self.responses[q_id] = current_response
+        if question_idx is not None and current_response is not None:
+            self.record_response(question_idx, current_response)
 
         if not self.responses:
             return None
@@ -113,10 +299,11 @@ class MBTIPocketFlowApp:
                 "questions": self.questions,
                 "responses": self.responses
             },
+            "response_code": encode_token(self.responses, self.questions),
             "metadata": {
                 "version": "1.0",
                 "created_at": datetime.now().isoformat(),
-                "completed": len(self.responses) == len(self.questions)
+                "completed": self.is_complete()
             }
         }
 
@@ -129,167 +316,110 @@ class MBTIPocketFlowApp:
             return saved_path
         return None
 
-    def run_pocketflow_analysis(self):
-        """Run complete PocketFlow analysis with LLM"""
-        if len(self.responses) != len(self.questions):
-            return "Please answer all questions before analyzing.", "", gr.update(visible=False)
-
-        try:
-            # Create flow and shared store
-            flow = create_mbti_flow()
-            config = {
-                "ui_mode": "gradio",
-                "output_format": "html",
-                "analysis_method": "both"  # Use both traditional and LLM
-            }
-            self.shared = create_shared_store(config)
-
-            # Pre-populate responses and current questions
-            self.shared["questionnaire"]["responses"] = self.responses
-            self.shared["questionnaire"]["questions"] = self.questions
+    def format_ai_analysis(self, llm_analysis_text, complete=True):
+        """Format AI analysis as markdown"""
+        footer = "*Analysis complete; report available for download*" if complete \
+            else "*Generating analysis...*"
+        return f"""
+## 🧠 AI Analysis
 
-            # Run partial flow (skip question loading/presentation)
-            from pocketflow import Flow
-            from nodes import AnalyzeResponsesBatchNode, TraditionalScoringNode, LLMAnalysisNode, DetermineMBTITypeNode, \
-                GenerateReportNode, ExportDataNode
+{llm_analysis_text}
 
-            analyze_responses = AnalyzeResponsesBatchNode()
-            traditional_scoring = TraditionalScoringNode()
-            llm_analysis = LLMAnalysisNode()
-            determine_type = DetermineMBTITypeNode()
-            generate_report = GenerateReportNode()
-            export_data = ExportDataNode()
+---
+{footer}
+            """
 
-            # Connect partial flow
-            analyze_responses >> traditional_scoring >> llm_analysis >> determine_type >> generate_report >> export_data
-            analysis_flow = Flow(start=analyze_responses)
+    async def run_pocketflow_analysis(self):
+        """Run complete PocketFlow analysis with LLM, streaming the AI analysis as it arrives"""
+        if not self.is_complete():
+            yield "Please answer all questions before analyzing.", "", gr.update(visible=False)
+            return
 
-            # Run the flow
-            print("Running PocketFlow analysis with LLM...")
-            analysis_flow.run(self.shared)
+        try:
+            # Attach to the speculative job for these answers if one is running or
+            # finished, otherwise start the scoring and LLM analysis now. The LLM
+            # call is awaited so it doesn't pin a Gradio worker thread, and the
+            # markdown renders as chunks arrive
+            while True:
+                self.update_speculation()
+                if self.job is None:
+                    self.job = AnalysisJob(self.questions, self.responses)
+                job = self.job
+                job.attached = True
+                print("Running PocketFlow analysis with LLM...")
+
+                async for streamed_text in job.stream():
+                    yield "", self.format_ai_analysis(streamed_text, complete=False), gr.update(visible=False)
+
+                if not job.task.cancelled():
+                    break
+                # Cancelled as superseded just before Analyze attached to it; run it again
+                print("DEBUG: Analysis job was cancelled, starting a new one")
+                if self.job is job:
+                    self.job = None
+
+            await job.task
+            self.shared = job.shared
+            await create_report_flow().run_async(self.shared)
 
             # Extract results
             mbti_type = self.shared["results"]["mbti_type"]
             scores = self.shared["analysis"]["traditional_scores"]
             llm_analysis_text = self.shared["analysis"]["llm_analysis"]
-            report_path = self.shared["exports"]["report_path"]
-
-            self.last_report_path = os.path.abspath(report_path)
-
-            # Read report HTML
-            with open(report_path, 'r', encoding='utf-8') as f:
-                report_html = f.read()
-
-            # Extract type info from HTML report for summary
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(report_html, 'html.parser')
-
-            # Get type badge and description
-            type_badge = soup.find('div', class_='type-badge')
-            type_desc = soup.find('p').find('em') if soup.find('p') else None
-
-            # Get strengths and weaknesses sections
-            sections = soup.find_all('div', class_='section')
-            strengths_html = ""
-            weaknesses_html = ""
-            careers_html = ""
-
-            for section in sections:
-                h2 = section.find('h2')
-                if h2:
-                    if 'Strengths' in h2.text:
-                        strengths_html = str(section)
-                    elif 'Growth' in h2.text or 'Areas' in h2.text:
-                        weaknesses_html = str(section)
-                    elif 'Career' in h2.text:
-                        careers_html = str(section)
-
-            # Get responses data for the table
-            responses_data = self.shared["analysis"].get("responses_data", [])
-
-            # Generate responses table HTML
-            responses_table_html = """
-            <div style="margin: 20px 0;">
-                <h2 style="color: #333; border-bottom: 2px solid #4CAF50;">Your Question Responses</h2>
-                <table style="width: 100%; border-collapse: collapse; margin: 10px 0;">
-                    <tr style="background: #f0f0f0;">
-                        <th style="padding: 8px; border: 1px solid #ddd; text-align: left;">Question</th>
-                        <th style="padding: 8px; border: 1px solid #ddd; text-align: center;">Dimension</th>
-                        <th style="padding: 8px; border: 1px solid #ddd; text-align: center;">Your Response</th>
-                    </tr>
-            """
+            self.report = self.shared["exports"]["report"]
+            sections = self.report.sections
 
-            for resp in responses_data:
-                responses_table_html += f"""
-                    <tr id="Q{resp['id']}">
-                        <td style="padding: 8px; border: 1px solid #ddd;"><strong>Q{resp['id']}:</strong> {resp['text']}</td>
-                        <td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{resp['dimension']}</td>
-                        <td style="padding: 8px; border: 1px solid #ddd; text-align: center;"><strong>{resp['response']}</strong></td>
-                    </tr>
-                """
-
-            responses_table_html += """
-                </table>
-            </div>
-            """
-
-            # Create HTML report sections
+            # Create HTML report sections from the in-memory report
             report_sections_html = f"""
             <div style="font-family: Arial, sans-serif; line-height: 1.6;">
                 <div style="text-align: center; margin-bottom: 30px;">
                     <h1>Your Personality Analysis</h1>
-                    {str(type_badge) if type_badge else f'<div style="background: #4CAF50; color: white; padding: 10px 20px; border-radius: 5px; display: inline-block;">{mbti_type}</div>'}
-                    {f'<p><em>{type_desc.text}</em></p>' if type_desc else ''}
+                    {sections['badge']}
+                    {sections['description']}
                 </div>
 
-                {responses_table_html}
+                <div style="margin: 20px 0;">
+                    <h2 style="color: #333; border-bottom: 2px solid #4CAF50;">Your Question Responses</h2>
+                    {sections['responses']}
+                </div>
 
-                {strengths_html}
-                {weaknesses_html}
-                {careers_html}
+                {sections['strengths']}
+                {sections['weaknesses']}
+                {sections['careers']}
 
                 <div style="margin: 20px 0;">
                     <h2 style="color: #333; border-bottom: 2px solid #4CAF50;">Traditional Dimension Scores</h2>
                     <ul>
             """
 
-            pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
-            for dim1, dim2 in pairs:
+            for dim1, dim2 in DIMENSION_PAIRS:
                 score1 = scores.get(f'{dim1}_score', 0.5)
                 score2 = scores.get(f'{dim2}_score', 0.5)
                 stronger = dim1 if score1 > score2 else dim2
                 percentage = max(score1, score2) * 100
                 report_sections_html += f"<li><strong>{dim1}/{dim2}</strong>: {stronger} ({percentage:.1f}%)</li>"
 
-            report_sections_html += """
+            report_sections_html += f"""
                     </ul>
+                    <h3>Score Stability</h3>
+                    {sections['confidence']}
                 </div>
             </div>
             """
 
-            # Format AI analysis as markdown
-            ai_analysis_md = f"""
-## 🧠 AI Analysis
-
-{llm_analysis_text}
-
----
-*Complete questionnaire and report saved via PocketFlow pipeline*
-            """
-
-            return report_sections_html, ai_analysis_md, gr.update(visible=True)
+            yield report_sections_html, self.format_ai_analysis(llm_analysis_text), gr.update(visible=True)
 
         except Exception as e:
             error_msg = f"Error in PocketFlow analysis: {e}"
             print(error_msg)
             import traceback
             traceback.print_exc()
-            return error_msg, "", gr.update(visible=False)
+            yield error_msg, "", gr.update(visible=False)
 
     def load_questionnaire_file(self, file):
         """Load questionnaire from uploaded file"""
         if file is None:
-            return "No file uploaded.", 0, self.get_question_text(0), 3
+            return "No file uploaded.", 0, self.get_question_text(0), 3, self.render_live_preview()
 
         try:
             with open(file.name, 'r', encoding='utf-8') as f:
@@ -303,25 +433,28 @@ class MBTIPocketFlowApp:
                 self.responses = data['questionnaire']['responses']
                 # Convert string keys to int keys
                 self.responses = {int(k): v for k, v in self.responses.items()}
+                self.adaptive = None  # a saved questionnaire keeps its own questions
+                self.scorer = IncrementalScorer(self.questions, self.responses)
+                self.discard_job()
 
                 # Start from first question
                 question_text = self.get_question_text(0)
                 current_response = self.get_current_response(0)
 
-                return f"Loaded questionnaire with {len(self.responses)} responses.", 0, question_text, current_response
+                return f"Loaded questionnaire with {len(self.responses)} responses.", 0, question_text, current_response, self.render_live_preview()
             else:
-                return "Invalid questionnaire file format.", 0, self.get_question_text(0), 3
+                return "Invalid questionnaire file format.", 0, self.get_question_text(0), 3, self.render_live_preview()
 
         except Exception as e:
-            return f"Error loading file: {e}", 0, self.get_question_text(0), 3
+            return f"Error loading file: {e}", 0, self.get_question_text(0), 3, self.render_live_preview()
 
     def reset_questionnaire(self):
         """Reset questionnaire to start over"""
-        self.responses = {}
+        self.start_session()
         self.shared = None
-        self.last_report_path = None
+        self.report = None
         return "", 0, self.get_question_text(0), 3, gr.update(visible=False), "", "", gr.update(
-            interactive=False), gr.update(interactive=True), gr.update(visible=False)
+            interactive=False), gr.update(interactive=True), gr.update(visible=False), self.render_live_preview()
 
 
 def create_pocketflow_gradio_app():
@@ -335,12 +468,19 @@ def create_pocketflow_gradio_app():
         # Questionnaire length selection
         with gr.Row():
             length_radio = gr.Radio(
-                choices=[20, 40, 60],
+                choices=[20, 40, 60, ADAPTIVE_CHOICE],
                 value=20,
                 label="Questionnaire Length",
-                info="Choose the number of questions (more questions = more accurate results)"
+                info="Choose the number of questions (more questions = more accurate results); "
+                     "Adaptive stops as soon as every dimension is clear"
             )
 
+        speculative_checkbox = gr.Checkbox(
+            value=app.speculative,
+            label="Start AI analysis as soon as all questions are answered",
+            info="Analyze then shows the analysis already in progress; changing an answer restarts it"
+        )
+
         # File upload section
         upload_file = gr.File(label="Load Previous Questionnaire (JSON)", file_types=[".json"])
         load_status = gr.Textbox(label="Load Status", interactive=False)
@@ -359,6 +499,9 @@ def create_pocketflow_gradio_app():
                 label="Your Response (1=Strongly Disagree, 5=Strongly Agree)"
             )
 
+        # Live provisional type, updated from the running tally on every answer
+        live_preview = gr.HTML(app.render_live_preview())
+
         # Navigation buttons
         with gr.Row():
             prev_btn = gr.Button("← Previous", interactive=False)
@@ -392,25 +535,36 @@ def create_pocketflow_gradio_app():
         length_radio.change(
             app.change_questionnaire_length,
             inputs=[length_radio],
-            outputs=[question_idx, question_text, response_slider, analyze_section]
+            outputs=[question_idx, question_text, response_slider, analyze_section, live_preview]
+        )
+
+        speculative_checkbox.change(
+            app.set_speculative,
+            inputs=[speculative_checkbox]
         )
 
         upload_file.upload(
             app.load_questionnaire_file,
             inputs=[upload_file],
-            outputs=[load_status, question_idx, question_text, response_slider]
+            outputs=[load_status, question_idx, question_text, response_slider, live_preview]
         )
 
+        async def prev_handler(idx, resp):
+            return await app.navigate_question(idx, "prev", resp)
+
+        async def next_handler(idx, resp):
+            return await app.navigate_question(idx, "next", resp)
+
         prev_btn.click(
-            lambda idx, resp: app.navigate_question(idx, "prev", resp),
+            prev_handler,
             inputs=[question_idx, response_slider],
-            outputs=[question_idx, question_text, response_slider, prev_btn, next_btn, analyze_section]
+            outputs=[question_idx, question_text, response_slider, prev_btn, next_btn, analyze_section, live_preview]
         )
 
         next_btn.click(
-            lambda idx, resp: app.navigate_question(idx, "next", resp),
+            next_handler,
             inputs=[question_idx, response_slider],
-            outputs=[question_idx, question_text, response_slider, prev_btn, next_btn, analyze_section]
+            outputs=[question_idx, question_text, response_slider, prev_btn, next_btn, analyze_section, live_preview]
         )
 
         # Export current progress
@@ -430,8 +584,9 @@ def create_pocketflow_gradio_app():
 
         analyze_btn.click(
             lambda: (gr.update(interactive=False, value="⏳ Analyzing..."),
-                     "🔄 **Running PocketFlow analysis with LLM... This may take a moment.**"),
-            outputs=[analyze_btn, analysis_status]
+                     "🔄 **Running PocketFlow analysis with LLM... This may take a moment.**",
+                     gr.update(visible=True)),
+            outputs=[analyze_btn, analysis_status, results_section]
         ).then(
             app.run_pocketflow_analysis_with_save,
             inputs=[question_idx, response_slider],
@@ -444,8 +599,9 @@ def create_pocketflow_gradio_app():
 
         # Download report
         def report_download_handler():
-            if app.last_report_path:
-                return gr.update(value=app.last_report_path, visible=True)
+            # The report is only written to disk once it is downloaded
+            if app.report is not None:
+                return gr.update(value=os.path.abspath(app.report.save()), visible=True)
             return gr.update()
 
         download_report_btn.click(
@@ -457,13 +613,13 @@ def create_pocketflow_gradio_app():
         response_slider.change(
             app.save_slider_response,
             inputs=[question_idx, response_slider],
-            outputs=[analyze_section]
+            outputs=[analyze_section, live_preview]
         )
 
         reset_btn.click(
             app.reset_questionnaire,
             outputs=[load_status, question_idx, question_text, response_slider, analyze_section, report_display,
-                     prev_btn, next_btn, download_report_btn]
+                     ai_analysis_display, prev_btn, next_btn, download_report_btn, live_preview]
         ).then(
             lambda: gr.update(visible=False),
             outputs=[results_section]
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks for the MBTI pipeline.
+
+LLM calls go to the local stub backend by default (see utils/llm_providers.py),
+so runs work offline and only measure our own overhead plus the simulated
+LLM timing.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def summarize(name, latencies, elapsed, ttfts=None):
+    """Print latency percentiles and throughput for one benchmark run"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    print(f"\n=== {name} ===")
+    print(f"Runs: {count} in {elapsed:.2f}s ({count / elapsed * 60:.1f} analyses/min)")
+    print(f"Latency  p50 {pct(latencies, 50):.3f}s  p95 {pct(latencies, 95):.3f}s  "
+          f"max {latencies[-1]:.3f}s  mean {statistics.mean(latencies):.3f}s")
+    if ttfts:
+        ttfts = sorted(ttfts)
+        print(f"TTFT     p50 {pct(ttfts, 50):.3f}s  p95 {pct(ttfts, 95):.3f}s  max {ttfts[-1]:.3f}s")
+
+
+def make_submissions(count, length):
+    """Random test submissions (distinct, so the LLM cache rarely hits)"""
+    from utils.questionnaire import get_questionnaire_by_length
+    from utils.test_data import generate_test_data
+
+    questions = get_questionnaire_by_length(length)
+    data = generate_test_data(count=count, questions=questions)
+    data = data if isinstance(data, list) else [data]
+    return questions, [d["responses"] for d in data]
+
+
+def bench_flow(args):
+    """create_mbti_flow, one run per thread"""
+    from flow import create_mbti_flow, create_shared_store
+
+    questions, submissions = make_submissions(args.runs, args.length)
+
+    def run_one(responses):
+        start = time.perf_counter()
+        shared = create_shared_store({"ui_mode": "test"})
+        shared["questionnaire"]["responses"] = dict(responses)
+        shared["questionnaire"]["questions"] = questions
+        create_mbti_flow().run(shared)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(run_one, submissions))
+    summarize(f"create_mbti_flow ({args.concurrency} threads)", latencies, time.perf_counter() - start)
+
+
+def bench_async_flow(args):
+    """create_async_analysis_flow with streaming, many runs on one event loop"""
+    from flow import create_async_analysis_flow, create_shared_store
+
+    questions, submissions = make_submissions(args.runs, args.length)
+
+    async def run_one(semaphore, responses):
+        async with semaphore:
+            start = time.perf_counter()
+            first_chunk = []
+            shared = create_shared_store({"ui_mode": "test"})
+            shared["questionnaire"]["responses"] = dict(responses)
+            shared["questionnaire"]["questions"] = questions
+            flow = create_async_analysis_flow(
+                on_chunk=lambda chunk: chunk is None or first_chunk or first_chunk.append(time.perf_counter())
+            )
+            await flow.run_async(shared)
+            end = time.perf_counter()
+            return end - start, (first_chunk[0] if first_chunk else end) - start
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        return await asyncio.gather(*(run_one(semaphore, r) for r in submissions))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    summarize(f"create_async_analysis_flow ({args.concurrency} concurrent)",
+              [r[0] for r in results], time.perf_counter() - start, [r[1] for r in results])
+
+
+def bench_server(args):
+    """MCP analyze_mbti_responses through an in-memory FastMCP client"""
+    from fastmcp import Client
+    import server
+
+    questions, submissions = make_submissions(args.runs, args.length)
+
+    async def run_one(client, semaphore, responses):
+        payload = {str(k): v for k, v in responses.items()}
+        payload["_questions"] = questions
+        async with semaphore:
+            start = time.perf_counter()
+            await client.call_tool("analyze_mbti_responses", {"responses": payload})
+            return time.perf_counter() - start
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        async with Client(server.mcp) as client:
+            return await asyncio.gather(*(run_one(client, semaphore, r) for r in submissions))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run_all())
+    summarize(f"server.analyze_mbti_responses ({args.concurrency} concurrent)", latencies,
+              time.perf_counter() - start)
+
+
+def bench_app(args):
+    """Gradio handler MBTIPocketFlowApp.run_pocketflow_analysis (one app per session)"""
+    from app import MBTIPocketFlowApp
+
+    questions, submissions = make_submissions(args.runs, args.length)
+
+    async def run_one(semaphore, responses):
+        async with semaphore:
+            app = MBTIPocketFlowApp()
+            app.questions = questions
+            app.responses = dict(responses)
+            start = time.perf_counter()
+            first_update = None
+            async for _ in app.run_pocketflow_analysis():
+                if first_update is None:
+                    first_update = time.perf_counter()
+            end = time.perf_counter()
+            return end - start, (first_update or end) - start
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        return await asyncio.gather(*(run_one(semaphore, r) for r in submissions))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    summarize(f"app.run_pocketflow_analysis ({args.concurrency} concurrent)",
+              [r[0] for r in results], time.perf_counter() - start, [r[1] for r in results])
+
+
+def bench_prompt(args):
+    """Input tokens and latency of the verbose vs compact analysis prompt at every length.
+
+    Calls the provider directly (no cache) so each run pays for its input;
+    token counts are the provider's own usage figures.
+    """
+    from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type
+    from utils.prompts import build_analysis_request, PROMPT_FORMATS
+    from utils.llm_providers import get_provider
+
+    provider = get_provider()
+    print(f"\n=== analysis prompt formats ({provider.name}, {args.runs} runs each) ===")
+    print(f"{'length':>6} {'format':>8} {'tokens':>8} {'p50':>8} {'p95':>8} {'vs verbose':>11}")
+
+    for length in (20, 40, 60):
+        questions, submissions = make_submissions(args.runs, length)
+        baseline = None
+        for prompt_format in PROMPT_FORMATS:
+            def run_one(responses):
+                scores = traditional_mbti_score(responses)
+                prompt, system_instruction, _ = build_analysis_request(
+                    questions, responses, determine_mbti_type(scores), scores, prompt_format)
+                usage = {}
+                start = time.perf_counter()
+                provider.generate(prompt, usage=usage, system_instruction=system_instruction)
+                return time.perf_counter() - start, usage.get("prompt_tokens") or 0
+
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                results = list(pool.map(run_one, submissions))
+            latencies = sorted(r[0] for r in results)
+            tokens = statistics.mean(r[1] for r in results)
+            baseline = baseline or tokens
+            print(f"{length:>6} {prompt_format:>8} {tokens:>8.0f} {latencies[len(latencies) // 2]:>7.3f}s "
+                  f"{latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]:>7.3f}s "
+                  f"{(tokens - baseline) / baseline * 100:>+10.1f}%")
+
+
+def bench_scoring(args):
+    """Vectorized score_matrix vs the per-dict traditional_mbti_score loop, checked for identical results"""
+    import numpy as np
+    from utils.batch_scoring import score_matrix, score_row
+    from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type
+    from utils.question_sets import get_question_set
+
+    questions = get_question_set(args.length)
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(0, 6, size=(args.rows, len(questions)), dtype=np.int8)  # 0 = unanswered
+    responses_list = [{q_id: int(v) for q_id, v in zip(questions.ids, row) if v} for row in matrix.tolist()]
+
+    start = time.perf_counter()
+    scalar = []
+    for responses in responses_list:
+        scores = traditional_mbti_score(responses, questions)
+        scalar.append((scores, determine_mbti_type(scores)))
+    scalar_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = score_matrix(matrix, questions)
+    vector_elapsed = time.perf_counter() - start
+
+    identical = all(score_row(result, i)[0] == scores and score_row(result, i)[2] == mbti_type
+                    for i, (scores, mbti_type) in enumerate(scalar))
+
+    print(f"\n=== scoring ({args.rows} submissions x {len(questions)} questions) ===")
+    print(f"traditional_mbti_score loop  {scalar_elapsed:.3f}s  ({args.rows / scalar_elapsed:,.0f}/s)")
+    print(f"score_matrix                 {vector_elapsed:.3f}s  ({args.rows / vector_elapsed:,.0f}/s)")
+    print(f"Speedup {scalar_elapsed / vector_elapsed:.0f}x, identical results: {identical}")
+
+
+def bench_report(args):
+    """render_report with the precompiled per-type templates vs compiling the template on every call"""
+    from utils.report_generator import render_report, compile_report_template, build_responses_data
+    from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type
+    from utils.bootstrap import bootstrap_confidence
+
+    questions, submissions = make_submissions(args.renders, args.length)
+    analyses = []
+    for responses in submissions:
+        scores = traditional_mbti_score(responses, questions)
+        analyses.append((determine_mbti_type(scores), {
+            "traditional_scores": scores,
+            "confidence_scores": bootstrap_confidence(responses, questions, resamples=100),
+            "responses_data": build_responses_data(questions, responses),
+            "llm_analysis": f"## Analysis\n\nYour answers to [Q1](#Q1) point to **{determine_mbti_type(scores)}**.",
+        }))
+    generated_at = "2000-01-01 00:00:00"
+
+    def run(label, items):
+        start = time.perf_counter()
+        compiled = [render_report(t, analysis, generated_at, template=compile_report_template(t)) for t, analysis in items]
+        compiled_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        precompiled = [render_report(t, analysis, generated_at) for t, analysis in items]
+        precompiled_elapsed = time.perf_counter() - start
+        print(f"{label:<22} compiled per call {len(items) / compiled_elapsed:>9,.0f}/s  "
+              f"precompiled {len(items) / precompiled_elapsed:>9,.0f}/s  "
+              f"speedup {compiled_elapsed / precompiled_elapsed:.1f}x  identical: {compiled == precompiled}")
+
+    print(f"\n=== report rendering ({args.renders} reports x {args.length} questions, renders/s) ===")
+    # Without LLM text the template layer is all that's measured; markdown conversion dominates otherwise
+    run("template and tables", [(t, dict(analysis, llm_analysis="")) for t, analysis in analyses])
+    run("with LLM markdown", analyses)
+
+
+def bench_batch_workers(args):
+    """score_stream_parallel wall time at each worker count, checked for identical output"""
+    import io
+    import json
+    from utils.stream_scoring import score_stream_parallel
+
+    questions, submissions = make_submissions(args.records, args.length)
+    lines = [json.dumps({"id": f"r{i}", "responses": responses}) for i, responses in enumerate(submissions)]
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    print(f"\n=== batch scoring workers ({args.records} records x {args.length} questions, {cpus} usable CPUs) ===")
+    baseline = expected = None
+    for workers in args.workers:
+        out = io.StringIO()
+        start = time.perf_counter()
+        for _ in score_stream_parallel(lines, out, workers=workers):
+            pass
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        expected = expected or out.getvalue()
+        note = "" if workers <= cpus else "  (more workers than CPUs)"
+        print(f"{workers:>2} workers  {elapsed:.2f}s  {args.records / elapsed:>9,.0f} records/s  "
+              f"speedup {baseline / elapsed:.2f}x  identical: {out.getvalue() == expected}{note}")
+
+
+BENCHMARKS = {
+    "flow": bench_flow,
+    "async-flow": bench_async_flow,
+    "server": bench_server,
+    "app": bench_app,
+    "prompt": bench_prompt,
+    "scoring": bench_scoring,
+    "report": bench_report,
+    "batch-workers": bench_batch_workers,
+}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='MBTI pipeline benchmarks')
+    parser.add_argument('target', choices=list(BENCHMARKS) + ['all'], help='What to benchmark')
+    parser.add_argument('--runs', type=int, default=50, help='Number of analyses')
+    parser.add_argument('--concurrency', type=int, default=10, help='Analyses in flight at once')
+    parser.add_argument('--length', type=int, default=20, choices=[20, 40, 60], help='Questionnaire length')
+    parser.add_argument('--provider', default='stub', help='LLM provider (stub or gemini)')
+    parser.add_argument('--rows', type=int, default=100000, help='Submissions for the scoring benchmark')
+    parser.add_argument('--renders', type=int, default=2000, help='Reports for the report benchmark')
+    parser.add_argument('--records', type=int, default=20000, help='Records for the batch-workers benchmark')
+    parser.add_argument('--workers', type=lambda s: [int(w) for w in s.split(',')], default=[1, 2, 4, 8],
+                        help='Comma-separated worker counts for the batch-workers benchmark')
+    parser.add_argument('--keep-cache', action='store_true', help='Use the normal LLM cache instead of a fresh one')
+
+    args = parser.parse_args()
+
+    # Configure before the LLM modules create their process-wide provider and cache
+    os.environ["LLM_PROVIDER"] = args.provider
+    # Let the stub charge for prompt size so input-token savings show up in latency
+    os.environ.setdefault("LLM_STUB_PREFILL_TOKENS_PER_SEC", "2000")
+    if not args.keep_cache:
+        os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="mbti_bench_"), "llm_cache.sqlite3")
+
+    targets = list(BENCHMARKS) if args.target == 'all' else [args.target]
+    for target in targets:
+        BENCHMARKS[target](args)
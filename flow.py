@@ -2,13 +2,15 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from pocketflow import Flow
+from pocketflow import Flow, AsyncFlow
 from nodes import (
     LoadQuestionnaireNode,
     PresentQuestionsNode, 
     AnalyzeResponsesBatchNode,
     TraditionalScoringNode,
     LLMAnalysisNode,
+    AsyncLLMAnalysisNode,
+    BatchLLMAnalysisNode,
     DetermineMBTITypeNode,
     GenerateReportNode,
     ExportDataNode
@@ -39,6 +41,49 @@ def create_mbti_flow():
     # Create and return flow
     return Flow(start=load_questionnaire)
 
+def create_async_analysis_flow(on_chunk=None, with_report=True):
+    """Create the analysis part of the flow (responses already collected) as an AsyncFlow.
+
+    The LLM step awaits the async Gemini client, so many analyses can be
+    in flight on one event loop. Pass on_chunk to stream the AI analysis
+    (it receives None whenever a retry restarts the stream).
+    With with_report=False the flow stops after the LLM step; run
+    create_report_flow on the same shared store to finish it.
+    """
+    analyze_responses = AnalyzeResponsesBatchNode()
+    traditional_scoring = TraditionalScoringNode()
+    determine_type = DetermineMBTITypeNode()
+    llm_analysis = AsyncLLMAnalysisNode(on_chunk=on_chunk)
+    
+    analyze_responses >> traditional_scoring >> determine_type >> llm_analysis
+    if with_report:
+        generate_report = GenerateReportNode()
+        llm_analysis >> generate_report >> ExportDataNode()
+    
+    return AsyncFlow(start=analyze_responses)
+
+def create_report_flow():
+    """Create the report and export steps, for a shared store that already holds the analysis"""
+    generate_report = GenerateReportNode()
+    generate_report >> ExportDataNode()
+    return AsyncFlow(start=generate_report)
+
+def create_batch_analysis_flow(concurrency=8):
+    """Create the bulk re-analysis flow (see BatchLLMAnalysisNode)"""
+    return AsyncFlow(start=BatchLLMAnalysisNode(concurrency=concurrency))
+
+def create_batch_shared_store(items, checkpoint):
+    """Create the shared store for create_batch_analysis_flow"""
+    return {
+        "batch": {
+            "items": items,
+            "checkpoint": checkpoint,
+            "results": [],
+            "failed": [],
+            "elapsed": 0.0
+        }
+    }
+
 def create_shared_store(config=None):
     """Create initial shared store with default configuration"""
     
@@ -46,7 +91,8 @@ def create_shared_store(config=None):
         "output_format": "html",
         "analysis_method": "both", 
         "ui_mode": "cli",
-        "import_file": None
+        "import_file": None,
+        "save_report": True  # False leaves exports["report"] in memory only
     }
     
     if config:
@@ -81,6 +127,7 @@ def create_shared_store(config=None):
         },
         "exports": {
             "questionnaire_json": "",
+            "report": None,
             "report_path": ""
         }
     }
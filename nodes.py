@@ -2,26 +2,46 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from pocketflow import Node, BatchNode
+from pocketflow import Node, BatchNode, AsyncNode, AsyncParallelBatchNode
 from utils.questionnaire import load_questionnaire, save_questionnaire
-from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type
-from utils.report_generator import generate_report
+from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type, normalize_response
+from utils.adaptive import AdaptiveQuestionnaire
+from utils.question_sets import DIMENSION_PAIRS
+from utils.response_codec import encode_token
+from utils.cohort_stats import get_cohort_store
+from utils.bootstrap import bootstrap_confidence
+from utils.report_generator import build_report, generate_fallback_analysis, build_responses_data
+from utils.deadline import get_deadline, run_with_deadline, arun_with_deadline, DeadlineExceeded
+from utils.prompts import build_analysis_request, analysis_cache_key
 # Conditional LLM import
 try:
-    from utils.call_llm import call_llm
+    from utils.call_llm import call_llm, acall_llm, call_llm_stream, acall_llm_stream
     LLM_AVAILABLE = True
 except ImportError:
     LLM_AVAILABLE = False
-    def call_llm(prompt):
+    def call_llm(prompt, use_cache=True, timeout=None, cache_key=None, system_instruction=None):
         return "LLM not available - install dependencies"
+    async def acall_llm(prompt, use_cache=True, timeout=None, cache_key=None, system_instruction=None):
+        return call_llm(prompt)
+    def call_llm_stream(prompt, use_cache=True, timeout=None, cache_key=None, system_instruction=None):
+        yield call_llm(prompt)
+    async def acall_llm_stream(prompt, use_cache=True, timeout=None, cache_key=None, system_instruction=None):
+        yield call_llm(prompt)
+import json
+import time
+import asyncio
+import threading
 from datetime import datetime
 
 class LoadQuestionnaireNode(Node):
     def prep(self, shared):
-        return shared.get("config", {}).get("import_file")
+        config = shared.get("config", {})
+        # Adaptive sessions draw from the full 60-question bank
+        return config.get("import_file"), 60 if config.get("adaptive") else 20
     
-    def exec(self, import_file):
-        return load_questionnaire(import_file)
+    def exec(self, inputs):
+        import_file, length = inputs
+        return load_questionnaire(import_file, length)
     
     def post(self, shared, prep_res, exec_res):
         shared["questionnaire"]["questions"] = exec_res
@@ -30,10 +50,25 @@ class LoadQuestionnaireNode(Node):
 
 class PresentQuestionsNode(Node):
     def prep(self, shared):
-        return shared["questionnaire"]["questions"], shared["config"]["ui_mode"]
+        config = shared["config"]
+        return shared["questionnaire"]["questions"], config["ui_mode"], config.get("adaptive", False)
+    
+    def ask(self, q):
+        """Prompt for one rating until it is valid"""
+        while True:
+            try:
+                print(f"Q{q['id']}: {q['text']}")
+                response = int(input("Your rating (1-5): "))
+                if 1 <= response <= 5:
+                    print()
+                    return response
+                else:
+                    print("Please enter a number between 1 and 5.")
+            except ValueError:
+                print("Please enter a valid number.")
     
     def exec(self, inputs):
-        questions, ui_mode = inputs
+        questions, ui_mode, adaptive = inputs
         responses = {}
         
         if ui_mode == "cli":
@@ -41,28 +76,27 @@ class PresentQuestionsNode(Node):
             print("Rate each statement from 1-5:")
             print("1=Strongly Disagree, 2=Disagree, 3=Neutral, 4=Agree, 5=Strongly Agree\n")
             
+            if adaptive:
+                # Stop as soon as every dimension is settled
+                session = AdaptiveQuestionnaire(bank=questions)
+                while (q := session.next_question()) is not None:
+                    responses[q['id']] = self.ask(q)
+                    session.answer(q['id'], responses[q['id']])
+                print(f"All dimensions settled after {len(responses)} of {len(questions)} questions.\n")
+                return responses, session.questions
+            
             for q in questions:
-                while True:
-                    try:
-                        print(f"Q{q['id']}: {q['text']}")
-                        response = int(input("Your rating (1-5): "))
-                        if 1 <= response <= 5:
-                            responses[q['id']] = response
-                            break
-                        else:
-                            print("Please enter a number between 1 and 5.")
-                    except ValueError:
-                        print("Please enter a valid number.")
-                print()
+                responses[q['id']] = self.ask(q)
         else:
-            # For Gradio mode, we'll handle this in the main interface
-            # For now, return empty responses to be filled by UI
-            pass
+            # For Gradio/test modes responses are filled in by the caller
+            return None
             
-        return responses
+        return responses, questions
     
     def post(self, shared, prep_res, exec_res):
-        shared["questionnaire"]["responses"] = exec_res
+        if exec_res is not None:
+            # Adaptive sessions keep only the questions actually asked
+            shared["questionnaire"]["responses"], shared["questionnaire"]["questions"] = exec_res
         return "default"
 
 class AnalyzeResponsesBatchNode(BatchNode):
@@ -72,16 +106,7 @@ class AnalyzeResponsesBatchNode(BatchNode):
     def exec(self, response_item):
         question_id, response = response_item
         # Validate and normalize response
-        if isinstance(response, str):
-            response_map = {
-                'strongly_disagree': 1, 'disagree': 2, 'neutral': 3,
-                'agree': 4, 'strongly_agree': 5
-            }
-            normalized = response_map.get(response, 3)
-        else:
-            normalized = max(1, min(5, int(response)))
-        
-        return (question_id, normalized)
+        return (question_id, normalize_response(response))
     
     def post(self, shared, prep_res, exec_res_list):
         # Update responses with normalized values
@@ -91,18 +116,30 @@ class AnalyzeResponsesBatchNode(BatchNode):
 
 class TraditionalScoringNode(Node):
     def prep(self, shared):
-        return shared["questionnaire"]["responses"]
+        return shared["questionnaire"]["responses"], shared["questionnaire"]["questions"]
     
-    def exec(self, responses):
-        return traditional_mbti_score(responses)
+    def exec(self, inputs):
+        responses, questions = inputs
+        # Score against the questions actually asked (all built-in ones if unknown)
+        return traditional_mbti_score(responses, questions or None)
     
     def post(self, shared, prep_res, exec_res):
         shared["analysis"]["traditional_scores"] = exec_res
         return "default"
 
 class LLMAnalysisNode(Node):
-    def __init__(self, max_retries=3):
-        super().__init__(max_retries=max_retries)
+    def __init__(self, max_retries=3, timeout=None, on_chunk=None, prompt_format=None, wait=2, deadline=None):
+        # Throttled calls are already retried with backoff by the shared rate limiter
+        # (utils/rate_limiter.py); node retries cover the rest after a short wait
+        super().__init__(max_retries=max_retries, wait=wait)
+        self.timeout = timeout  # per-request seconds, None uses the pooled client default
+        # If set, the analysis is streamed and each text chunk passed here; on_chunk(None)
+        # starts every attempt, so a retried stream replaces the partial text instead of extending it
+        self.on_chunk = on_chunk
+        self.prompt_format = prompt_format  # "verbose" or "compact", None reads LLM_PROMPT_FORMAT
+        # End-to-end seconds across all retries, None reads LLM_DEADLINE; past it
+        # exec_fallback answers from a template while the LLM call finishes in the background
+        self.deadline = deadline if deadline is not None else get_deadline()
         if not LLM_AVAILABLE:
             print("Warning: LLM not available, using fallback analysis")
     
@@ -117,104 +154,207 @@ class LLMAnalysisNode(Node):
             questions = load_questionnaire()
             shared["questionnaire"]["questions"] = questions
         
-        # Format responses for LLM with dimension info
-        formatted_responses = []
-        for q in questions:
-            response_val = responses.get(q['id'], 3)
-            response_text = {1: "Strongly Disagree", 2: "Disagree", 3: "Neutral", 
-                           4: "Agree", 5: "Strongly Agree"}[response_val]
-            dimension = q.get('dimension', 'Unknown')
-            formatted_responses.append(f"Q{q['id']} ({dimension}): {q['text']} - **{response_text}**")
-        
-        print(f"DEBUG: Formatted {len(formatted_responses)} questions for LLM")
-        return "\n".join(formatted_responses), mbti_type, traditional_scores
+        print(f"DEBUG: Prepared {len(questions)} questions for LLM")
+        self.deadline_at = time.monotonic() + self.deadline if self.deadline else None
+        self.used_fallback = False
+        return questions, responses, mbti_type, traditional_scores
+    
+    def build_request(self, inputs):
+        """Return the keyword arguments for call_llm: prompt, system_instruction and cache_key"""
+        questions, responses, mbti_type, traditional_scores = inputs
+        prompt, system_instruction, template_version = build_analysis_request(
+            questions, responses, mbti_type, traditional_scores, self.prompt_format)
+        return {
+            "prompt": prompt,
+            "system_instruction": system_instruction,
+            "cache_key": analysis_cache_key(questions, responses, mbti_type, template_version),
+        }
+    
+    def remaining(self):
+        """Seconds left before the deadline, None without one"""
+        return None if self.deadline_at is None else self.deadline_at - time.monotonic()
     
     def exec(self, inputs):
-        formatted_responses, mbti_type, traditional_scores = inputs
+        request = self.build_request(inputs)
+        expired = threading.Event()  # stops forwarding chunks once the fallback is shown
         
-        # Format dimension scores for context
-        dimension_info = []
-        pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
-        for dim1, dim2 in pairs:
-            score1 = traditional_scores.get(f'{dim1}_score', 0.5)
-            score2 = traditional_scores.get(f'{dim2}_score', 0.5)
-            stronger = dim1 if score1 > score2 else dim2
-            percentage = max(score1, score2) * 100
-            dimension_info.append(f"{dim1}/{dim2}: {stronger} ({percentage:.1f}%)")
+        def generate():
+            if self.on_chunk is None:
+                return call_llm(timeout=self.timeout, **request)
+            
+            if not expired.is_set():
+                self.on_chunk(None)
+            chunks = []
+            for chunk in call_llm_stream(timeout=self.timeout, **request):
+                chunks.append(chunk)
+                if not expired.is_set():
+                    self.on_chunk(chunk)
+            return "".join(chunks)
         
-        prompt = f"""
-You are analyzing MBTI questionnaire responses for someone determined to be {mbti_type} type.
-
-Here are their EXACT responses to each question:
-
-{formatted_responses}
-
-Traditional scoring results:
-{chr(10).join(dimension_info)}
-
-IMPORTANT: You have been provided with the complete set of questions and responses above. Please analyze these SPECIFIC responses.
-
-Provide a detailed analysis that:
-
-1. **Response Pattern Analysis**: Identify which responses strongly support the {mbti_type} determination and which might seem unexpected. Reference specific questions (e.g., "Q5 shows...", "Your response to Q12 indicates...").
-
-2. **Characteristic Alignment**: Explain how their responses align with typical {mbti_type} characteristics, citing specific questions as evidence.
-
-3. **Out-of-Character Responses**: Point out any responses that seem inconsistent with typical {mbti_type} patterns and provide possible explanations.
-
-4. **Behavioral Patterns**: Describe key behavioral patterns shown through their responses, referencing the relevant questions.
-
-5. **Strengths & Growth Areas**: Based on their specific responses, identify strengths they demonstrate and areas for potential growth.
-
-6. **Communication & Work Style**: Infer their communication and work preferences from their question responses.
-
-Must reference the actual questions provided above throughout your analysis using markdown anchor links like [Q1](#Q1), [Q2](#Q2), etc. This will create clickable links to the specific questions in the report. Do not make assumptions about questions not provided.
-"""
-        return call_llm(prompt)
+        try:
+            return run_with_deadline(generate, self.remaining())
+        except DeadlineExceeded as e:
+            expired.set()
+            return self.exec_fallback(inputs, e)
+    
+    def exec_fallback(self, inputs, exc):
+        # Deadline passed or every retry failed: answer instantly from local data
+        print(f"LLM analysis unavailable ({exc!r}), using template analysis")
+        self.used_fallback = True
+        questions, responses, mbti_type, traditional_scores = inputs
+        return generate_fallback_analysis(questions, responses, mbti_type, traditional_scores)
     
     def post(self, shared, prep_res, exec_res):
         shared["analysis"]["llm_analysis"] = exec_res
+        shared["analysis"]["llm_fallback"] = self.used_fallback
         
         # Store responses data for report
-        responses = shared["questionnaire"]["responses"]
-        questions = shared["questionnaire"]["questions"]
-        responses_data = []
+        shared["analysis"]["responses_data"] = build_responses_data(
+            shared["questionnaire"]["questions"], shared["questionnaire"]["responses"])
+        return "default"
+
+class AsyncLLMAnalysisNode(AsyncNode, LLMAnalysisNode):
+    """LLMAnalysisNode for AsyncFlow: the Gemini call awaits instead of blocking a thread"""
+    
+    async def prep_async(self, shared):
+        return self.prep(shared)
+    
+    async def exec_async(self, inputs):
+        request = self.build_request(inputs)
+        expired = threading.Event()
         
-        for q in questions:
-            response_val = responses.get(q['id'], 3)
-            response_text = {1: "Strongly Disagree", 2: "Disagree", 3: "Neutral", 
-                           4: "Agree", 5: "Strongly Agree"}[response_val]
-            responses_data.append({
-                'id': q['id'],
-                'text': q['text'],
-                'dimension': q.get('dimension', 'Unknown'),
-                'response': response_text,
-                'value': response_val
-            })
+        async def generate():
+            if self.on_chunk is None:
+                return await acall_llm(timeout=self.timeout, **request)
+            
+            if not expired.is_set():
+                self.on_chunk(None)
+            chunks = []
+            async for chunk in acall_llm_stream(timeout=self.timeout, **request):
+                chunks.append(chunk)
+                if not expired.is_set():
+                    self.on_chunk(chunk)
+            return "".join(chunks)
+        
+        try:
+            return await arun_with_deadline(generate(), self.remaining())
+        except DeadlineExceeded as e:
+            expired.set()
+            return self.exec_fallback(inputs, e)
+    
+    async def exec_fallback_async(self, inputs, exc):
+        return self.exec_fallback(inputs, exc)
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
+class BatchLLMAnalysisNode(AsyncParallelBatchNode, LLMAnalysisNode):
+    """Re-run the LLM analysis over many stored questionnaires, at most `concurrency` at a time.
+    
+    Each finished analysis is appended to the checkpoint JSONL file, and
+    questionnaires already in it are skipped, so an interrupted run resumes.
+    """
+    
+    def __init__(self, concurrency=8, max_retries=3, timeout=None, progress_every=10, prompt_format=None, wait=2):
+        super().__init__(max_retries=max_retries, timeout=timeout, prompt_format=prompt_format, wait=wait)
+        self.concurrency = concurrency
+        self.progress_every = progress_every
+    
+    async def prep_async(self, shared):
+        batch = shared["batch"]
+        checkpoint = batch["checkpoint"]
         
-        shared["analysis"]["responses_data"] = responses_data
+        done_ids = set()
+        if os.path.exists(checkpoint):
+            with open(checkpoint, 'r', encoding='utf-8') as f:
+                done_ids = {json.loads(line)["id"] for line in f if line.strip()}
+        
+        pending = [item for item in batch["items"] if item["id"] not in done_ids]
+        # Unreadable records count as failed (never checkpointed), so a fixed file is retried on resume
+        self.invalid = [item for item in pending if "error" in item]
+        for item in self.invalid:
+            print(f"Batch analysis skipped {item['id']}: {item['error']}")
+        pending = [item for item in pending if "error" not in item]
+        print(f"Batch analysis: {len(pending)} to run, {len(done_ids)} already in checkpoint, "
+              f"{len(self.invalid)} invalid")
+        
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.checkpoint_file = open(checkpoint, 'a', encoding='utf-8')
+        self.total = len(pending)
+        self.completed = 0
+        self.started_at = time.perf_counter()
+        return pending
+    
+    async def exec_async(self, item):
+        questions, responses = item["questions"], item["responses"]
+        traditional_scores = traditional_mbti_score(responses, questions)
+        mbti_type = determine_mbti_type(traditional_scores)
+        inputs = (questions, responses, mbti_type, traditional_scores)
+        
+        async with self.semaphore:
+            llm_analysis = await acall_llm(timeout=self.timeout, **self.build_request(inputs))
+        
+        result = {
+            "id": item["id"],
+            "mbti_type": mbti_type,
+            "traditional_scores": traditional_scores,
+            "llm_analysis": llm_analysis,
+            "analyzed_at": datetime.now().isoformat()
+        }
+        self.checkpoint_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.checkpoint_file.flush()
+        self._report_progress()
+        return result
+    
+    async def exec_fallback_async(self, item, exc):
+        # Left out of the checkpoint so the next run retries it
+        print(f"Batch analysis failed for {item['id']}: {exc}")
+        self._report_progress()
+        return {"id": item["id"], "error": str(exc)}
+    
+    def _report_progress(self):
+        self.completed += 1
+        if self.completed % self.progress_every == 0 or self.completed == self.total:
+            elapsed = time.perf_counter() - self.started_at
+            rate = self.completed / elapsed * 60 if elapsed > 0 else 0.0
+            print(f"  {self.completed}/{self.total} analyses, {rate:.1f}/min")
+    
+    async def post_async(self, shared, prep_res, exec_res_list):
+        self.checkpoint_file.close()
+        elapsed = time.perf_counter() - self.started_at
+        exec_res_list = list(exec_res_list) + self.invalid
+        shared["batch"]["results"] = exec_res_list
+        shared["batch"]["failed"] = [r["id"] for r in exec_res_list if "error" in r]
+        shared["batch"]["elapsed"] = elapsed
         return "default"
 
 class DetermineMBTITypeNode(Node):
     def prep(self, shared):
-        return shared["analysis"]["traditional_scores"], shared["analysis"].get("llm_analysis", "")
+        return (
+            shared["analysis"]["traditional_scores"],
+            shared["analysis"].get("llm_analysis", ""),
+            shared["questionnaire"]["responses"],
+            shared["questionnaire"]["questions"]
+        )
     
     def exec(self, inputs):
-        traditional_scores, llm_analysis = inputs
+        traditional_scores, llm_analysis, responses, questions = inputs
         
         # Primary determination from traditional scoring
         mbti_type = determine_mbti_type(traditional_scores)
         
         # Calculate confidence scores
         confidence_scores = {}
-        pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
         
-        for dim1, dim2 in pairs:
+        for dim1, dim2 in DIMENSION_PAIRS:
             score1 = traditional_scores.get(f'{dim1}_score', 0.5)
             score2 = traditional_scores.get(f'{dim2}_score', 0.5)
             confidence = abs(score1 - score2)  # Higher difference = higher confidence
             confidence_scores[f'{dim1}{dim2}_confidence'] = confidence
         
+        # How often resampling the answers would flip each letter
+        confidence_scores.update(bootstrap_confidence(responses, questions or None))
+        
         return {
             "mbti_type": mbti_type,
             "confidence_scores": confidence_scores
@@ -230,15 +370,19 @@ class GenerateReportNode(Node):
         return (
             shared["results"]["mbti_type"],
             shared["analysis"],
-            shared["config"]["output_format"]
+            shared["config"]["output_format"],
+            shared["config"].get("save_report", True)
         )
     
     def exec(self, inputs):
-        mbti_type, analysis, output_format = inputs
-        return generate_report(mbti_type, analysis, output_format)
+        mbti_type, analysis, output_format, save_report = inputs
+        report = build_report(mbti_type, analysis, output_format)
+        # Rendering is lazy: a repeat report is found in the report cache without rendering
+        # or writing anything, and the UI renders the object only when it shows it
+        return report, report.save() if save_report else ""
     
     def post(self, shared, prep_res, exec_res):
-        shared["exports"]["report_path"] = exec_res
+        shared["exports"]["report"], shared["exports"]["report_path"] = exec_res
         return "default"
 
 class ExportDataNode(Node):
@@ -248,9 +392,10 @@ class ExportDataNode(Node):
     def exec(self, inputs):
         questionnaire, results = inputs
         
-        # Create export data
+        # Create export data, with the answers also packed into a compact token
         export_data = {
             "questionnaire": questionnaire,
+            "response_code": encode_token(questionnaire["responses"], questionnaire["questions"] or None),
             "results": results,
             "metadata": {
                 "exported_at": datetime.now().isoformat(),
@@ -271,5 +416,12 @@ class ExportDataNode(Node):
         
         if success:
             shared["exports"]["questionnaire_json"] = filename
+            # Update the cohort statistics as each flow finishes; never fail the export over it
+            try:
+                get_cohort_store().record(export_data["results"]["mbti_type"], shared["analysis"]["traditional_scores"],
+                                          export_data["questionnaire"]["responses"],
+                                          export_data["metadata"]["exported_at"])
+            except Exception as e:
+                print(f"Failed to update cohort statistics: {e}")
         
         return "default"
\ No newline at end of file
@@ -9,9 +9,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from flow import create_mbti_flow, create_shared_store
 from utils.test_data import generate_test_data
+from utils.question_sets import DIMENSION_PAIRS
 
-def run_pocketflow_questionnaire(import_file=None):
-    """Run questionnaire using PocketFlow"""
+def run_pocketflow_questionnaire(import_file=None, adaptive=False):
+    """Run questionnaire using PocketFlow (adaptive: stop once every dimension is settled)"""
     print("=== MBTI Questionnaire (PocketFlow) ===\n")
     
     # Create flow and shared store
@@ -20,7 +21,8 @@ def run_pocketflow_questionnaire(import_file=None):
         "ui_mode": "cli",
         "output_format": "html",
         "analysis_method": "traditional",  # Skip LLM for now
-        "import_file": import_file
+        "import_file": import_file,
+        "adaptive": adaptive
     }
     shared = create_shared_store(config)
     
@@ -47,8 +49,7 @@ def run_pocketflow_questionnaire(import_file=None):
         traditional = shared['analysis']['traditional_scores']
         if traditional:
             print(f"\nDimension Scores:")
-            pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
-            for dim1, dim2 in pairs:
+            for dim1, dim2 in DIMENSION_PAIRS:
                 score1 = traditional.get(f'{dim1}_score', 0.5)
                 score2 = traditional.get(f'{dim2}_score', 0.5)
                 stronger = dim1 if score1 > score2 else dim2
@@ -122,6 +123,114 @@ def run_pocketflow_test(mbti_type=None):
     
     return True
 
+def run_batch_analysis(input_path, output_path, concurrency=8):
+    """Re-run LLM analysis for exported questionnaires, resuming from output_path"""
+    import asyncio
+    from flow import create_batch_analysis_flow, create_batch_shared_store
+    from utils.questionnaire import iter_questionnaires
+
+    print("=== MBTI Batch Analysis (PocketFlow) ===\n")
+
+    items = list(iter_questionnaires(input_path))
+    print(f"Loaded {len(items)} questionnaires from {input_path}")
+
+    flow = create_batch_analysis_flow(concurrency=concurrency)
+    shared = create_batch_shared_store(items, output_path)
+
+    try:
+        asyncio.run(flow.run_async(shared))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted - rerun the same command to resume from {output_path}")
+        return False
+
+    batch = shared["batch"]
+    done = len(batch["results"]) - len(batch["failed"])
+    rate = done / batch["elapsed"] * 60 if batch["elapsed"] > 0 else 0.0
+    print(f"\nAnalysed {done} questionnaires in {batch['elapsed']:.1f}s ({rate:.1f}/min)")
+    if batch["failed"]:
+        print(f"{len(batch['failed'])} failed and will be retried on the next run")
+    print(f"Results: {output_path}")
+    return not batch["failed"]
+
+def run_batch_scoring(input_path, output_path=None, fmt=None, with_llm=False, with_report=False, workers=1,
+                      bootstrap=False):
+    """Stream submissions from a JSONL/CSV file (or '-' for stdin) to JSONL results in constant memory,
+    sharded across `workers` processes when more than one"""
+    import time
+    import contextlib
+    from utils.stream_scoring import score_stream, score_stream_parallel
+
+    if fmt is None:
+        fmt = "csv" if input_path.lower().endswith(".csv") else "jsonl"
+    source = "stdin" if input_path == "-" else os.path.basename(input_path)
+
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if input_path == "-" else stack.enter_context(
+            open(input_path, 'r', encoding='utf-8', newline=''))
+        out = sys.stdout if output_path in (None, "-") else stack.enter_context(
+            open(output_path, 'w', encoding='utf-8'))
+        # Results own stdout; progress and debug output go to stderr
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+
+        started = time.perf_counter()
+        scored = failed = 0
+        try:
+            if workers > 1:
+                for count, invalid in score_stream_parallel(lines, out, fmt, source, with_llm, with_report,
+                                                            workers=workers, bootstrap=bootstrap):
+                    scored += count
+                    failed += invalid
+            else:
+                for result in score_stream(lines, out, fmt, source, with_llm, with_report, bootstrap=bootstrap):
+                    scored += 1
+                    failed += "error" in result
+        except KeyboardInterrupt:
+            print(f"\nInterrupted after {scored} submissions")
+            return False
+        except BrokenPipeError:
+            # Downstream consumer (e.g. head) closed the pipe
+            return True
+
+        elapsed = time.perf_counter() - started
+        rate = scored / elapsed if elapsed > 0 else 0.0
+        print(f"Scored {scored - failed} submissions ({failed} invalid) in {elapsed:.1f}s ({rate:.1f}/s)")
+    return failed == 0
+
+def run_cohort_stats(days=7, since=None, until=None, rebuild=None):
+    """Print the type distribution and dimension means for a period, optionally rebuilding first"""
+    import time
+    from utils.cohort_stats import get_cohort_store, iter_archive
+
+    store = get_cohort_store()
+    if rebuild is not None:
+        started = time.perf_counter()
+        count = store.rebuild(iter_archive(rebuild or None))
+        print(f"Rebuilt cohort statistics from {count} archived results in {time.perf_counter() - started:.1f}s\n")
+
+    started = time.perf_counter()
+    summary = store.query(since, until) if since or until else store.query_days(days)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    period = f"{since or 'start'} to {until or 'today'}" if since or until else f"last {days} days"
+    print(f"=== MBTI Cohort ({period}, {summary['count']} results, {elapsed_ms:.1f}ms) ===")
+    if not summary['count']:
+        return True
+
+    print("\nType distribution:")
+    for mbti_type, entry in summary['types'].items():
+        print(f"  {mbti_type}: {entry['count']:6d} ({entry['share'] * 100:.1f}%)")
+
+    print("\nDimension scores (mean ± std):")
+    for dim1, dim2 in DIMENSION_PAIRS:
+        first, second = summary['dimensions'][dim1], summary['dimensions'][dim2]
+        print(f"  {dim1}/{dim2}: {first['mean'] * 100:.1f}% ± {first['variance'] ** 0.5 * 100:.1f} / "
+              f"{second['mean'] * 100:.1f}% ± {second['variance'] ** 0.5 * 100:.1f}")
+
+    print("\nResults per day:")
+    for bucket, count in summary['buckets'].items():
+        print(f"  {bucket}: {count}")
+    return True
+
 if __name__ == "__main__":
     import argparse
     
@@ -129,12 +238,43 @@ if __name__ == "__main__":
     parser.add_argument('--test', action='store_true', help='Run in test mode')
     parser.add_argument('--test-type', type=str, help='MBTI type for test mode')
     parser.add_argument('--import-file', type=str, help='Import questionnaire from JSON')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Ask from the 60-question bank and stop once every dimension is settled')
+    parser.add_argument('--reanalyze', type=str, metavar='PATH',
+                        help='Re-run LLM analysis for a directory of exported JSON files or a JSONL file')
+    parser.add_argument('--batch', type=str, metavar='PATH',
+                        help="Score a JSONL or CSV file of submissions ('-' for stdin), streaming JSONL results")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='Input format for --batch (default: from extension)')
+    parser.add_argument('--with-llm', action='store_true', help='Add the LLM analysis to each --batch result')
+    parser.add_argument('--with-report', action='store_true', help='Write an HTML report for each --batch result')
+    parser.add_argument('--bootstrap', action='store_true',
+                        help='Add bootstrap flip probabilities and intervals to each --batch result')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for --batch (results stay in input order)')
+    parser.add_argument('--output', type=str,
+                        help='Results/checkpoint JSONL for --reanalyze (default mbti_reanalysis.jsonl), '
+                             'results JSONL for --batch (default stdout)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent LLM analyses for --reanalyze')
+    parser.add_argument('--cohort', action='store_true',
+                        help='Show the type distribution and dimension scores of stored results')
+    parser.add_argument('--days', type=int, default=7, help='Period for --cohort, ending today')
+    parser.add_argument('--since', type=str, metavar='YYYY-MM-DD', help='Start date for --cohort (instead of --days)')
+    parser.add_argument('--until', type=str, metavar='YYYY-MM-DD', help='End date for --cohort (instead of --days)')
+    parser.add_argument('--rebuild-cohort', nargs='?', const='', metavar='PATH',
+                        help='Rebuild cohort statistics from exports (default: the temp directory) and show them')
     
     args = parser.parse_args()
     
-    if args.test:
+    if args.cohort or args.rebuild_cohort is not None:
+        success = run_cohort_stats(args.days, args.since, args.until, args.rebuild_cohort)
+    elif args.batch:
+        success = run_batch_scoring(args.batch, args.output, args.format, args.with_llm, args.with_report,
+                                    args.workers, args.bootstrap)
+    elif args.reanalyze:
+        success = run_batch_analysis(args.reanalyze, args.output or 'mbti_reanalysis.jsonl', args.concurrency)
+    elif args.test:
         success = run_pocketflow_test(args.test_type)
     else:
-        success = run_pocketflow_questionnaire(args.import_file)
+        success = run_pocketflow_questionnaire(args.import_file, args.adaptive)
     
     exit(0 if success else 1)
\ No newline at end of file
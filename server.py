@@ -11,10 +11,19 @@ from typing import Dict, List, Any
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
 from utils.questionnaire import get_questionnaire_by_length
 from utils.mbti_scoring import traditional_mbti_score, determine_mbti_type
-from utils.call_llm import call_llm
+from utils.adaptive import AdaptiveQuestionnaire
+from utils.question_sets import DIMENSION_PAIRS
+from utils.cohort_stats import get_cohort_store
+from utils.bootstrap import bootstrap_confidence
+from utils.call_llm import acall_llm_stream
+from utils.prompts import build_analysis_prompt, build_analysis_request, analysis_cache_key
+from utils.llm_client import get_client, get_request_timeout
+from utils.llm_providers import get_provider
+from utils.deadline import get_deadline, arun_with_deadline
+from utils.report_generator import generate_fallback_analysis
 
 # Initialize MCP server
 mcp = FastMCP("MBTI Personality Test Server")
@@ -24,11 +33,24 @@ def _get_mbti_scores_and_type(responses: Dict[str, Any]):
     """Common function to get normalized responses, scores, and MBTI type"""
     # Extract just the numeric responses for scoring
     normalized_responses = {int(k): int(v) for k, v in responses.items() if k.isdigit()}
-    traditional_scores = traditional_mbti_score(normalized_responses)
+    traditional_scores = traditional_mbti_score(normalized_responses, responses.get('_questions'))
     mbti_type = determine_mbti_type(traditional_scores)
     return normalized_responses, traditional_scores, mbti_type
 
 
+RATING_INSTRUCTIONS = {
+    "rating_scale": "Rate each statement from 1-5",
+    "scale_meaning": {
+        "1": "Strongly Disagree",
+        "2": "Disagree",
+        "3": "Neutral",
+        "4": "Agree",
+        "5": "Strongly Agree"
+    },
+    "note": "Answer based on your typical behavior and preferences as an AI system"
+}
+
+
 @mcp.tool()
 def get_mbti_questionnaire(length: int = 20) -> Dict[str, Any]:
     """
@@ -46,81 +68,50 @@ def get_mbti_questionnaire(length: int = 20) -> Dict[str, Any]:
     questions = get_questionnaire_by_length(length)
 
     return {
-        "instructions": {
-            "rating_scale": "Rate each statement from 1-5",
-            "scale_meaning": {
-                "1": "Strongly Disagree",
-                "2": "Disagree",
-                "3": "Neutral",
-                "4": "Agree",
-                "5": "Strongly Agree"
-            },
-            "note": "Answer based on your typical behavior and preferences as an AI system"
-        },
+        "instructions": RATING_INSTRUCTIONS,
         "questions": questions,
         "total_questions": len(questions)
     }
 
 
-def _generate_mbti_prompt(responses: Dict[str, Any]) -> str:
-    """Internal function to generate MBTI analysis prompt with full question context"""
-    # Get scores and type
-    normalized_responses, traditional_scores, mbti_type = _get_mbti_scores_and_type(responses)
+@mcp.tool()
+def get_next_adaptive_question(responses: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Adaptive questionnaire: get the next question, or finish once every dimension is settled.
     
-    # Questions must be provided in responses
-    questions = responses['_questions']
-    question_lookup = {q['id']: q for q in questions}
-
-    # Format responses for LLM analysis with full question text
-    formatted_responses = []
+    Call repeatedly, passing all answers so far. Questions come from the
+    60-question bank, always from the least settled dimension, so most
+    sessions finish well before 60.
     
-    for q_id, response_val in normalized_responses.items():
-        response_text = {1: "Strongly Disagree", 2: "Disagree", 3: "Neutral",
-                       4: "Agree", 5: "Strongly Agree"}[response_val]
+    Args:
+        responses: Dictionary mapping question IDs to ratings (1-5) answered so far
         
-        q = question_lookup[q_id]
-        dimension = q.get('dimension', 'Unknown')
-        formatted_responses.append(f"Q{q['id']} ({dimension}): {q['text']} - **{response_text}**")
-
-    # Generate dimension info
-    dimension_info = []
-    pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
-    for dim1, dim2 in pairs:
-        score1 = traditional_scores.get(f'{dim1}_score', 0.5)
-        score2 = traditional_scores.get(f'{dim2}_score', 0.5)
-        stronger = dim1 if score1 > score2 else dim2
-        percentage = max(score1, score2) * 100
-        dimension_info.append(f"{dim1}/{dim2}: {stronger} ({percentage:.1f}%)")
-
-    # Return comprehensive analysis prompt
-    return f"""
-You are analyzing MBTI questionnaire responses for an AI system determined to be {mbti_type} type.
-
-Here are their EXACT responses to each question:
-
-{chr(10).join(formatted_responses)}
-
-Traditional scoring results:
-{chr(10).join(dimension_info)}
-
-IMPORTANT: You have been provided with the complete set of questions and responses above. Please analyze these SPECIFIC responses.
-
-Provide a detailed analysis that:
-
-1. **Response Pattern Analysis**: Identify which responses strongly support the {mbti_type} determination and which might seem unexpected. Reference specific questions (e.g., "Q5 shows...", "Your response to Q12 indicates...").
-
-2. **Characteristic Alignment**: Explain how their responses align with typical {mbti_type} characteristics, citing specific questions as evidence.
-
-3. **Out-of-Character Responses**: Point out any responses that seem inconsistent with typical {mbti_type} patterns and provide possible explanations.
+    Returns:
+        Next question (None when done), per-dimension progress, and the questions
+        asked so far; once done, pass them as '_questions' to analyze_mbti_responses
+    """
+    answers = {int(k): int(v) for k, v in (responses or {}).items() if str(k).isdigit()}
+    session = AdaptiveQuestionnaire(answers)
+    question = session.next_question()
 
-4. **Behavioral Patterns**: Describe key behavioral patterns shown through their responses, referencing the relevant questions.
+    return {
+        "instructions": RATING_INSTRUCTIONS,
+        "done": question is None,
+        "question": question,
+        "progress": session.progress(),
+        "questions": session.questions
+    }
 
-5. **Strengths & Growth Areas**: Based on their specific responses, identify strengths they demonstrate and areas for potential growth.
 
-6. **Communication & Work Style**: Infer their communication and work preferences from their question responses.
+def _generate_mbti_prompt(responses: Dict[str, Any], subject: str = "someone") -> str:
+    """Internal function to generate MBTI analysis prompt with full question context"""
+    # Get scores and type
+    normalized_responses, traditional_scores, mbti_type = _get_mbti_scores_and_type(responses)
 
-Must reference the actual questions provided above throughout your analysis using markdown anchor links like [Q1](#Q1), [Q2](#Q2), etc. This will create clickable links to the specific questions in the report. Do not make assumptions about questions not provided.
-"""
+    # Questions must be provided in responses; the prompt is shared with the app
+    # so identical answers produce identical prompts and cache keys
+    return build_analysis_prompt(responses['_questions'], normalized_responses, mbti_type,
+                                 traditional_scores, subject=subject)
 
 @mcp.tool()
 def get_mbti_prompt(responses: Dict[str, Any]) -> str:
@@ -134,39 +125,63 @@ def get_mbti_prompt(responses: Dict[str, Any]) -> str:
     Returns:
         Analysis prompt string for LLM self-analysis
     """
-    return _generate_mbti_prompt(responses)
+    return _generate_mbti_prompt(responses, subject="an AI system")
 
 @mcp.tool()
-def analyze_mbti_responses(responses: Dict[str, Any]) -> Dict[str, Any]:
+async def analyze_mbti_responses(responses: Dict[str, Any], ctx: Context = None) -> Dict[str, Any]:
     """
     Analyze MBTI questionnaire responses and return personality analysis.
     
     Args:
         responses: Dictionary mapping question IDs to ratings (1-5)
                   Must include '_questions' key with question definitions
+        ctx: MCP context, used to stream the analysis as progress notifications
         
     Returns:
         Complete MBTI analysis including type, scores, and detailed analysis
     """
-    # Get the analysis prompt (does all the heavy lifting)
-    llm_prompt = _generate_mbti_prompt(responses)
-
     # Get scores and type (reuse common function)
     normalized_responses, traditional_scores, mbti_type = _get_mbti_scores_and_type(responses)
 
+    # Same request as the app's LLMAnalysisNode, in the LLM_PROMPT_FORMAT format
+    llm_prompt, system_instruction, template_version = build_analysis_request(
+        responses['_questions'], normalized_responses, mbti_type, traditional_scores)
+    cache_key = analysis_cache_key(responses['_questions'], normalized_responses, mbti_type, template_version)
+
+    reporting = {"active": ctx is not None}
+
+    async def stream_analysis():
+        # Streamed and awaited so other MCP requests keep running while Gemini
+        # responds, and the client sees the analysis as it is generated
+        chunks = []
+        async for chunk in acall_llm_stream(llm_prompt, timeout=get_request_timeout(),
+                                            cache_key=cache_key, system_instruction=system_instruction):
+            chunks.append(chunk)
+            if reporting["active"]:
+                await ctx.report_progress(progress=len(chunks), message=chunk)
+        return "".join(chunks)
+
+    llm_fallback = False
     try:
-        llm_analysis = call_llm(llm_prompt)
+        # Past LLM_DEADLINE the template analysis is returned; the LLM call
+        # finishes in the background and fills the cache for the next request
+        llm_analysis = await arun_with_deadline(stream_analysis(), get_deadline())
     except Exception as e:
-        llm_analysis = f"LLM analysis unavailable: {str(e)}"
+        reporting["active"] = False
+        print(f"LLM analysis unavailable ({e!r}), using template analysis", file=sys.stderr)
+        llm_analysis = generate_fallback_analysis(responses['_questions'], normalized_responses, mbti_type,
+                                                  traditional_scores)
+        llm_fallback = True
 
     # Calculate confidence scores
     confidence_scores = {}
-    pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
-    for dim1, dim2 in pairs:
+    for dim1, dim2 in DIMENSION_PAIRS:
         score1 = traditional_scores.get(f'{dim1}_score', 0.5)
         score2 = traditional_scores.get(f'{dim2}_score', 0.5)
         confidence = abs(score1 - score2)
         confidence_scores[f'{dim1}{dim2}_confidence'] = confidence
+    # Bootstrap flip probability and interval of each letter, as in the app's report
+    confidence_scores.update(bootstrap_confidence(normalized_responses, responses.get('_questions')))
 
     return {
         "mbti_type": mbti_type,
@@ -199,17 +214,46 @@ def analyze_mbti_responses(responses: Dict[str, Any]) -> Dict[str, Any]:
             }
         },
         "llm_analysis": llm_analysis,
+        "llm_fallback": llm_fallback,
         "response_count": len(normalized_responses),
         "analysis_timestamp": __import__('datetime').datetime.now().isoformat()
     }
 
 
+@mcp.tool()
+def get_cohort_stats(days: int = 7, since: str = None, until: str = None,
+                     include_questions: bool = False) -> Dict[str, Any]:
+    """
+    Read-only statistics over stored questionnaire results.
+    
+    Args:
+        days: Period ending today (ignored when since or until is given)
+        since: Optional start date, YYYY-MM-DD
+        until: Optional end date, YYYY-MM-DD
+        include_questions: Also return the answer histogram of every question
+        
+    Returns:
+        Result count, type distribution, per-dimension mean/variance and results per day
+    """
+    store = get_cohort_store()
+    if since or until:
+        return store.query(since, until, include_questions)
+    return store.query_days(days, include_questions)
+
+
 # Export an ASGI app for uvicorn; choose a single path for Streamable HTTP (e.g. /mcp)
 app = mcp.http_app(path="/mcp")
 
 if __name__ == "__main__":
     import sys
 
+    # Create the pooled Gemini client up front so the first analysis doesn't pay for it
+    try:
+        if get_provider().name == "gemini":
+            get_client()
+    except ValueError as e:
+        print(f"Warning: Gemini client not initialised: {e}", file=sys.stderr)
+
     # No uvicorn, just internal FastMCP server
 
     # Check for --http flag
@@ -0,0 +1,115 @@
+import os
+
+try:
+    from .question_sets import get_question_set, DIMENSION_PAIRS
+    from .mbti_scoring import IncrementalScorer
+except ImportError:  # run as a script
+    from question_sets import get_question_set, DIMENSION_PAIRS
+    from mbti_scoring import IncrementalScorer
+
+# A pair is settled once this many of its questions are answered and its
+# confidence (|first - second| share) reaches the threshold
+DEFAULT_CONFIDENCE_THRESHOLD = 0.2
+DEFAULT_MIN_PER_PAIR = 4
+
+
+def get_adaptive_settings():
+    """(threshold, min_per_pair) from ADAPTIVE_CONFIDENCE_THRESHOLD and ADAPTIVE_MIN_PER_PAIR"""
+    return (float(os.getenv("ADAPTIVE_CONFIDENCE_THRESHOLD", DEFAULT_CONFIDENCE_THRESHOLD)),
+            int(os.getenv("ADAPTIVE_MIN_PER_PAIR", DEFAULT_MIN_PER_PAIR)))
+
+
+class AdaptiveQuestionnaire:
+    """Adaptive session over a question bank (all 60 built-in questions by default).
+
+    Each next question comes from the least settled dimension pair, taking
+    the pole with fewer answers first, and the session ends once every
+    pair is settled or out of questions. The choice depends only on the
+    answers so far, so a session can be rebuilt from its responses alone.
+    """
+
+    def __init__(self, responses=None, bank=None, threshold=None, min_per_pair=None):
+        default_threshold, default_min_per_pair = get_adaptive_settings()
+        self.bank = get_question_set(bank)
+        self.threshold = default_threshold if threshold is None else threshold
+        self.min_per_pair = default_min_per_pair if min_per_pair is None else min_per_pair
+        self.scorer = IncrementalScorer(self.bank)
+        self.asked = []  # question dicts in the order they were answered
+        for question_id, response in (responses or {}).items():
+            self.answer(question_id, response)
+
+    def answer(self, question_id, response):
+        """Record or change an answer"""
+        if question_id not in self.bank.position:
+            raise ValueError(f"Question {question_id} is not in the question bank")
+        if question_id not in self.scorer.answers:
+            self.asked.append(self.bank.questions[self.bank.position[question_id]])
+        self.scorer.set(question_id, response)
+
+    @property
+    def questions(self):
+        """The questions asked so far, as a new list (safe to pass as a question set)"""
+        return list(self.asked)
+
+    def pair_status(self):
+        """Answered/available counts, confidence and settled flag for each pair, e.g. status['EI']"""
+        confidence = self.scorer.confidence()
+        status = {}
+        for dim1, dim2 in DIMENSION_PAIRS:
+            columns = self.bank.by_dimension[dim1] + self.bank.by_dimension[dim2]
+            answered = sum(1 for column in columns if self.bank.ids[column] in self.scorer.answers)
+            pair_confidence = confidence[f'{dim1}{dim2}_confidence']
+            status[f'{dim1}{dim2}'] = {
+                "answered": answered,
+                "available": len(columns),
+                "confidence": pair_confidence,
+                "settled": answered >= len(columns) or (
+                    answered >= self.min_per_pair and pair_confidence >= self.threshold),
+            }
+        return status
+
+    def next_question(self):
+        """The next question to ask, or None when every pair is settled"""
+        status = self.pair_status()
+        # Pairs short of min_per_pair first, then the lowest confidence
+        unsettled = [(s["answered"] >= self.min_per_pair, s["confidence"], pair)
+                     for pair, s in zip(DIMENSION_PAIRS, status.values()) if not s["settled"]]
+        if not unsettled:
+            return None
+        _, _, pair = min(unsettled)
+
+        remaining = {}
+        for dimension in pair:
+            columns = self.bank.by_dimension[dimension]
+            remaining[dimension] = [c for c in columns if self.bank.ids[c] not in self.scorer.answers]
+        # Balance the poles so one side's wording doesn't dominate the margin
+        dimension = max(pair, key=lambda d: (bool(remaining[d]),
+                                             len(remaining[d]) - len(self.bank.by_dimension[d])))
+        return self.bank.questions[remaining[dimension][0]]
+
+    @property
+    def done(self):
+        return self.next_question() is None
+
+    def progress(self):
+        """Summary for the UI and MCP clients"""
+        return {
+            "answered": self.scorer.answered,
+            "max_questions": len(self.bank),
+            "provisional_type": self.scorer.mbti_type(),
+            "pairs": self.pair_status(),
+            "done": self.done,
+        }
+
+
+if __name__ == "__main__":
+    # Simulate a decisive INTJ respondent
+    from test_data import generate_test_data
+
+    answers = generate_test_data("INTJ", questions=60)["responses"]
+    session = AdaptiveQuestionnaire()
+    while (question := session.next_question()) is not None:
+        session.answer(question['id'], answers[question['id']])
+    print(f"{session.scorer.mbti_type()} after {session.scorer.answered} of {len(session.bank)} questions")
+    rebuilt = AdaptiveQuestionnaire({q['id']: answers[q['id']] for q in session.asked})
+    print(f"Rebuilt from responses: done={rebuilt.done}, same order={rebuilt.asked == session.asked}")
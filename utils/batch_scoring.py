@@ -0,0 +1,105 @@
+import functools
+
+import numpy as np
+
+try:
+    from .question_sets import get_question_set, DIMENSIONS, DIMENSION_PAIRS
+except ImportError:  # run as a script
+    from question_sets import get_question_set, DIMENSIONS, DIMENSION_PAIRS
+
+# Score matrix columns follow DIMENSIONS, so pairs are adjacent (E/I, S/N, T/F, J/P)
+SCORE_KEYS = tuple(f'{d}_score' for d in DIMENSIONS)
+CONFIDENCE_KEYS = tuple(f'{a}{b}_confidence' for a, b in DIMENSION_PAIRS)
+
+# Type for every 4-bit code, bit i set when the second letter of pair i wins
+_TYPES = np.array([
+    "".join(pair[(code >> i) & 1] for i, pair in enumerate(DIMENSION_PAIRS)) for code in range(16)
+])
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+@functools.lru_cache(maxsize=32)
+def _dimension_matrix(dimensions):
+    one_hot = np.zeros((len(dimensions), len(DIMENSIONS)), dtype=np.float64)
+    for row, dimension in enumerate(dimensions):
+        if dimension in DIMENSIONS:
+            one_hot[row, DIMENSIONS.index(dimension)] = 1.0
+    one_hot.setflags(write=False)
+    return one_hot
+
+
+def dimension_matrix(questions):
+    """Q x 8 one-hot matrix mapping each question (column of the response matrix) to its dimension"""
+    return _dimension_matrix(get_question_set(questions).dimensions)
+
+
+def responses_to_matrix(responses_list, questions, dtype=np.int8):
+    """N x Q response matrix from response dicts; unanswered questions are 0 (they add nothing)"""
+    ids = get_question_set(questions).ids
+    matrix = np.zeros((len(responses_list), len(ids)), dtype=dtype)
+    for row, responses in enumerate(responses_list):
+        matrix[row] = [int(responses.get(q_id, 0)) for q_id in ids]
+    return matrix
+
+
+def score_matrix(responses, questions, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Score an N x Q integer response matrix whose columns follow questions
+    (a QuestionSet, question list or built-in length).
+
+    Returns a dict with "scores" (N x 8, columns DIMENSIONS), "confidence"
+    (N x 4, |first - second| per pair) and "types" (N four-letter strings).
+    Values are identical to traditional_mbti_score / determine_mbti_type /
+    DetermineMBTITypeNode on the same answers: dimension sums are exact in
+    float64, and the division and comparisons are the same IEEE operations.
+    """
+    questions = get_question_set(questions)
+    responses = np.asarray(responses)
+    if responses.ndim != 2 or responses.shape[1] != len(questions):
+        raise ValueError(f"Expected an N x {len(questions)} response matrix, got shape {responses.shape}")
+    one_hot = dimension_matrix(questions)
+
+    rows = responses.shape[0]
+    scores = np.empty((rows, len(DIMENSIONS)), dtype=np.float64)
+    # Chunked so the float64 copy of the responses stays small for huge archives
+    for start in range(0, rows, chunk_rows):
+        chunk = responses[start:start + chunk_rows].astype(np.float64)
+        sums = chunk @ one_hot
+        first, second = sums[:, 0::2], sums[:, 1::2]
+        total = first + second
+        empty = total == 0
+        safe_total = np.where(empty, 1.0, total)
+        scores[start:start + chunk_rows, 0::2] = np.where(empty, 0.5, first / safe_total)
+        scores[start:start + chunk_rows, 1::2] = np.where(empty, 0.5, second / safe_total)
+
+    first, second = scores[:, 0::2], scores[:, 1::2]
+    # determine_mbti_type picks the first letter only on a strict win
+    codes = ((first <= second).astype(np.uint8) << np.arange(len(DIMENSION_PAIRS), dtype=np.uint8)).sum(axis=1)
+    return {
+        "scores": scores,
+        "confidence": np.abs(first - second),
+        "types": _TYPES[codes],
+    }
+
+
+def score_row(result, index):
+    """One row of a score_matrix result as the dicts the scalar functions return"""
+    return (
+        dict(zip(SCORE_KEYS, result["scores"][index].tolist())),
+        dict(zip(CONFIDENCE_KEYS, result["confidence"][index].tolist())),
+        str(result["types"][index]),
+    )
+
+
+if __name__ == "__main__":
+    # Compare against the scalar scorer
+    from mbti_scoring import traditional_mbti_score, determine_mbti_type
+
+    questions = get_question_set(60)
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(1, 6, size=(5, len(questions)), dtype=np.int8)
+    result = score_matrix(matrix, questions)
+    for i in range(len(matrix)):
+        scores, confidence, mbti_type = score_row(result, i)
+        expected = traditional_mbti_score(dict(zip(questions.ids, matrix[i].tolist())), questions)
+        print(mbti_type, determine_mbti_type(expected), scores == expected)
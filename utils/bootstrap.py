@@ -0,0 +1,132 @@
+import os
+import hashlib
+
+import numpy as np
+
+try:
+    from .question_sets import get_question_set, DIMENSION_PAIRS
+    from .mbti_scoring import normalize_response
+    from .batch_scoring import responses_to_matrix
+except ImportError:  # run as a script
+    from question_sets import get_question_set, DIMENSION_PAIRS
+    from mbti_scoring import normalize_response
+    from batch_scoring import responses_to_matrix
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_LEVEL = 0.95
+# Upper bound on resampled answers held in memory at once (rows x resamples x items)
+DEFAULT_CHUNK_ELEMENTS = 4_000_000
+
+
+def get_resamples():
+    """Bootstrap resamples per respondent (BOOTSTRAP_RESAMPLES)"""
+    return int(os.getenv("BOOTSTRAP_RESAMPLES", DEFAULT_RESAMPLES))
+
+
+def _row_seeds(responses, seed):
+    """One seed per row from its answers, so a row's draws don't depend on its batch"""
+    rows = np.ascontiguousarray(responses, dtype=np.int8)
+    return [[seed, int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "little")]
+            for row in rows]
+
+
+def _resample_sums(values, resamples, seeds):
+    """Sums of `resamples` bootstrap draws of each row's answered items (0 = unanswered)"""
+    rows, items = values.shape
+    if items == 0:
+        return np.zeros((rows, resamples), dtype=np.int32)
+    answered = values > 0
+    counts = answered.sum(axis=1)
+    # Answered items first in each row, so draws index into that prefix
+    packed = np.take_along_axis(values, np.argsort(~answered, axis=1, kind="stable"), axis=1).astype(np.int32)
+    uniform = np.stack([np.random.default_rng(row_seed).random((resamples, items), dtype=np.float32)
+                        for row_seed in seeds])
+    draws = (uniform * counts[:, None, None]).astype(np.intp)
+    np.minimum(draws, np.maximum(counts - 1, 0)[:, None, None], out=draws)
+    picked = packed[np.arange(rows)[:, None, None], draws]
+    # Each resample draws as many items as the row answered
+    in_sample = np.arange(items) < counts[:, None]
+    return (picked * in_sample[:, None, :]).sum(axis=2)
+
+
+def bootstrap_matrix(responses, questions, resamples=None, level=DEFAULT_LEVEL, seed=0,
+                     chunk_elements=DEFAULT_CHUNK_ELEMENTS):
+    """Bootstrap letter stability for an N x Q response matrix (0 = unanswered).
+
+    Each pole's answered items are resampled with replacement, all resamples
+    at once. Returns N x 4 arrays (columns follow DIMENSION_PAIRS): "flip_probability",
+    the share of resamples whose letter differs from the observed one, and
+    "low"/"high", the level interval of the first letter's share (E, S, T, J).
+    Each row draws from its own generator, seeded from seed and the row's
+    answers, so the same answers give the same values alone or in any batch.
+    """
+    question_set = get_question_set(questions)
+    responses = np.asarray(responses)
+    if responses.ndim != 2 or responses.shape[1] != len(question_set):
+        raise ValueError(f"Expected an N x {len(question_set)} response matrix, got shape {responses.shape}")
+    resamples = resamples or get_resamples()
+    row_seeds = _row_seeds(responses, seed)
+
+    rows = responses.shape[0]
+    flip = np.empty((rows, len(DIMENSION_PAIRS)))
+    low = np.empty((rows, len(DIMENSION_PAIRS)))
+    high = np.empty((rows, len(DIMENSION_PAIRS)))
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+    for p, (dim1, dim2) in enumerate(DIMENSION_PAIRS):
+        columns1 = list(question_set.by_dimension[dim1])
+        columns2 = list(question_set.by_dimension[dim2])
+        step = max(1, chunk_elements // (resamples * max(len(columns1), len(columns2), 1)))
+        for start in range(0, rows, step):
+            block = responses[start:start + step]
+            first, second = block[:, columns1], block[:, columns2]
+            seeds = row_seeds[start:start + step]
+            # Distinct streams per pair and pole
+            sums1 = _resample_sums(first, resamples, [row_seed + [p, 0] for row_seed in seeds])
+            sums2 = _resample_sums(second, resamples, [row_seed + [p, 1] for row_seed in seeds])
+            total = sums1 + sums2
+            share = np.where(total > 0, sums1 / np.where(total > 0, total, 1), 0.5)
+            # determine_mbti_type picks the first letter only on a strict win
+            observed = first.sum(axis=1) > second.sum(axis=1)
+            flip[start:start + step, p] = ((sums1 > sums2) != observed[:, None]).mean(axis=1)
+            low[start:start + step, p], high[start:start + step, p] = np.quantile(share, quantiles, axis=1)
+    return {"flip_probability": flip, "low": low, "high": high}
+
+
+def bootstrap_row(result, index):
+    """One row of a bootstrap_matrix result as confidence_scores entries (floats only)"""
+    entries = {}
+    for p, (dim1, dim2) in enumerate(DIMENSION_PAIRS):
+        entries[f'{dim1}{dim2}_flip_probability'] = float(result["flip_probability"][index, p])
+        entries[f'{dim1}{dim2}_interval_low'] = float(result["low"][index, p])
+        entries[f'{dim1}{dim2}_interval_high'] = float(result["high"][index, p])
+    return entries
+
+
+def bootstrap_confidence(responses, questions=None, resamples=None, level=DEFAULT_LEVEL, seed=0):
+    """Flip probability and interval of each pair for one respondent, e.g. EI_flip_probability,
+    EI_interval_low and EI_interval_high (bounds of the E share)"""
+    question_set = get_question_set(questions)
+    normalized = {q_id: normalize_response(r) for q_id, r in responses.items()}
+    matrix = responses_to_matrix([normalized], question_set)
+    return bootstrap_row(bootstrap_matrix(matrix, question_set, resamples, level, seed), 0)
+
+
+if __name__ == "__main__":
+    # Stability of a decisive and a borderline respondent, and batch timing
+    import time
+    from test_data import generate_test_data
+
+    decisive = generate_test_data("INTJ", questions=40)["responses"]
+    borderline = {q_id: 3 + (q_id % 3 == 0) - (q_id % 3 == 1) for q_id in range(1, 41)}
+    for name, responses in (("decisive", decisive), ("borderline", borderline)):
+        started = time.perf_counter()
+        entries = bootstrap_confidence(responses, 40)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        flips = ", ".join(f"{d1}{d2} {entries[f'{d1}{d2}_flip_probability']:.2f}" for d1, d2 in DIMENSION_PAIRS)
+        print(f"{name}: flip {flips}; E share [{entries['EI_interval_low']:.2f}, "
+              f"{entries['EI_interval_high']:.2f}] in {elapsed_ms:.1f}ms")
+
+    matrix = responses_to_matrix([generate_test_data(questions=60)["responses"] for _ in range(1000)], 60)
+    started = time.perf_counter()
+    bootstrap_matrix(matrix, 60)
+    print(f"1000 respondents x {get_resamples()} resamples in {time.perf_counter() - started:.2f}s")
@@ -1,102 +1,266 @@
-from google import genai
-import os
+import time
+import asyncio
 import logging
-import json
-from datetime import datetime
 
-# Configure logging
-log_directory = os.getenv("LOG_DIR", "logs")
-os.makedirs(log_directory, exist_ok=True)
-log_file = os.path.join(
-    log_directory, f"llm_calls_{datetime.now().strftime('%Y%m%d')}.log"
-)
+from .llm_cache import get_cache, make_cache_key
+from .llm_log import get_llm_logger, log_llm_call
+from .llm_providers import get_provider
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .singleflight import SingleFlight
 
-# Set up logger
-logger = logging.getLogger("llm_logger")
-logger.setLevel(logging.INFO)
-logger.propagate = False  # Prevent propagation to root logger
 
-# Create formatter
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+def get_model():
+    """Model name of the active provider (part of every cache key)"""
+    return get_provider().model
 
-# Add file handler
-file_handler = logging.FileHandler(log_file, encoding='utf-8')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
 
-# Add stdout handler
-stdout_handler = logging.StreamHandler()
-stdout_handler.setFormatter(formatter)
-# logger.addHandler(stdout_handler)
+def _make_key(prompt, model, cache_key, system_instruction):
+    if cache_key is None and system_instruction:
+        return make_cache_key(system_instruction + "\0" + prompt, model)
+    return make_cache_key(cache_key or prompt, model)
 
-# Simple cache configuration - use temp directory for HF Spaces
-import tempfile
-cache_file = os.path.join(tempfile.gettempdir(), "llm_cache.json")
+
+def _cache_lookup(cache_key):
+    try:
+        return get_cache().get(cache_key)
+    except Exception as e:
+        get_llm_logger().warning(f"Failed to read cache: {e}")
+        return None
+
+
+def _cache_store(cache_key, response_text, model):
+    try:
+        get_cache().set(cache_key, response_text, model)
+    except Exception as e:
+        get_llm_logger().error(f"Failed to save cache: {e}")
+
+
+def _log_cache_hit(prompt, response_text, model, start):
+    log_llm_call("call", prompt, response_text, model, latency=time.perf_counter() - start, cache_hit=True)
+
+
+# Identical prompts already in flight are waited on rather than re-sent
+_flight = SingleFlight()
 
 
 # By default, we Google Gemini 2.5 pro, as it shows great performance for code understanding
-def call_llm(prompt: str, use_cache: bool = True) -> str:
-    # Log the prompt
-    logger.info(f"PROMPT: {prompt}")
+def call_llm(prompt: str, use_cache: bool = True, timeout: float = None,
+             cache_key: str = None, system_instruction: str = None) -> str:
+    """Call the LLM, serving repeats from cache.
+
+    cache_key replaces the prompt text as the cache identity (see
+    utils.prompts.analysis_cache_key); it is always combined with the model.
+    system_instruction carries static instructions separately from the prompt.
+    """
+    start = time.perf_counter()
+    model = get_model()
+    cache_key = _make_key(prompt, model, cache_key, system_instruction)
+
+    if not use_cache:
+        return _generate(prompt, model, timeout, system_instruction)
+
+    # Return from cache if exists
+    cached = _cache_lookup(cache_key)
+    if cached is not None:
+        _log_cache_hit(prompt, cached, model, start)
+        return cached
+
+    def generate_and_cache():
+        response_text = _generate(prompt, model, timeout, system_instruction)
+        _cache_store(cache_key, response_text, model)
+        return response_text
+
+    return _flight.do(cache_key, generate_and_cache)
+
+
+def _generate(prompt, model, timeout, system_instruction):
+    # The provider is chosen by LLM_PROVIDER (see utils/llm_providers.py); the shared
+    # rate limiter paces the call and retries throttled attempts with backoff
+    start = time.perf_counter()
+    usage = {}
+    try:
+        response_text = get_rate_limiter().call(
+            lambda: get_provider().generate(prompt, timeout, usage, system_instruction),
+            estimate_tokens(prompt, system_instruction), usage)
+    except Exception as e:
+        log_llm_call("call", prompt, model=model, latency=time.perf_counter() - start, error=e,
+                     level=logging.ERROR)
+        raise
+
+    log_llm_call("call", prompt, response_text, model, latency=time.perf_counter() - start,
+                 prompt_tokens=usage.get("prompt_tokens"), response_tokens=usage.get("response_tokens"))
+    return response_text
+
+
+async def acall_llm(prompt: str, use_cache: bool = True, timeout: float = None,
+                    cache_key: str = None, system_instruction: str = None) -> str:
+    """Async variant of call_llm built on the provider's async API"""
+    start = time.perf_counter()
+    model = get_model()
+    cache_key = _make_key(prompt, model, cache_key, system_instruction)
+
+    if not use_cache:
+        return await _agenerate(prompt, model, timeout, system_instruction)
+
+    # SQLite access is blocking, so keep it off the event loop
+    cached = await asyncio.to_thread(_cache_lookup, cache_key)
+    if cached is not None:
+        _log_cache_hit(prompt, cached, model, start)
+        return cached
+
+    async def generate_and_cache():
+        response_text = await _agenerate(prompt, model, timeout, system_instruction)
+        await asyncio.to_thread(_cache_store, cache_key, response_text, model)
+        return response_text
+
+    return await _flight.ado(cache_key, generate_and_cache)
+
+
+async def _agenerate(prompt, model, timeout, system_instruction):
+    start = time.perf_counter()
+    usage = {}
+    try:
+        response_text = await get_rate_limiter().acall(
+            lambda: get_provider().agenerate(prompt, timeout, usage, system_instruction),
+            estimate_tokens(prompt, system_instruction), usage)
+    except Exception as e:
+        log_llm_call("call", prompt, model=model, latency=time.perf_counter() - start, error=e,
+                     level=logging.ERROR)
+        raise
+
+    log_llm_call("call", prompt, response_text, model, latency=time.perf_counter() - start,
+                 prompt_tokens=usage.get("prompt_tokens"), response_tokens=usage.get("response_tokens"))
+    return response_text
+
+
+class _StreamTimer:
+    """Tracks time-to-first-token and total time of one streamed call"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+
+    def chunk(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def log(self, prompt, response_text, model, usage, error=None):
+        # Time-to-first-token is what the user perceives, so it is the headline metric
+        end = time.perf_counter()
+        log_llm_call("stream", prompt, response_text, model, latency=end - self.start,
+                     ttft=(self.first_token_at or end) - self.start,
+                     prompt_tokens=usage.get("prompt_tokens"), response_tokens=usage.get("response_tokens"),
+                     error=error, level=logging.ERROR if error else logging.INFO)
+
+
+def call_llm_stream(prompt: str, use_cache: bool = True, timeout: float = None,
+                    cache_key: str = None, system_instruction: str = None):
+    """Streaming variant of call_llm: yields text chunks as they arrive.
+
+    A cache hit, or a prompt already being generated by another caller,
+    yields the whole text as one chunk. The full text is cached once the
+    stream completes.
+    """
+    start = time.perf_counter()
+    model = get_model()
+    cache_key = _make_key(prompt, model, cache_key, system_instruction)
 
-    # Check cache if enabled
     if use_cache:
-        # Load cache from disk
-        cache = {}
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, "r", encoding="utf-8") as f:
-                    cache = json.load(f)
-            except:
-                logger.warning(f"Failed to load cache, starting with empty cache")
-
-        # Return from cache if exists
-        if prompt in cache:
-            logger.info(f"RESPONSE cached: {cache[prompt]}")
-            return cache[prompt]
-
-    # # Call the LLM if not in cache or cache disabled
-    # client = genai.Client(
-    #     vertexai=True,
-    #     # TODO: change to your own project id and location
-    #     project=os.getenv("GEMINI_PROJECT_ID", "your-project-id"),
-    #     location=os.getenv("GEMINI_LOCATION", "us-central1")
-    # )
-
-    # You can comment the previous line and use the AI Studio key instead:
-    client = genai.Client(
-        api_key=os.getenv("GEMINI_API_KEY", ""),
-    )
-    # pro was too slow and janky
-    model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-    # model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-preview-04-17")
-    
-    response = client.models.generate_content(model=model, contents=[prompt])
-    response_text = response.text
-
-    # Log the response
-    logger.info(f"RESPONSE: {response_text}")
-
-    # Update cache if enabled
+        cached = _cache_lookup(cache_key)
+        if cached is not None:
+            _log_cache_hit(prompt, cached, model, start)
+            yield cached
+            return
+
+        outcome, is_leader = _flight.join(cache_key)
+        if not is_leader:
+            yield outcome
+            return
+        future = outcome
+
+    timer = _StreamTimer()
+    usage = {}
+    chunks = []
+    try:
+        for chunk in get_rate_limiter().stream(
+                lambda: get_provider().generate_stream(prompt, timeout, usage, system_instruction),
+                estimate_tokens(prompt, system_instruction), usage):
+            timer.chunk()
+            chunks.append(chunk)
+            yield chunk
+        response_text = "".join(chunks)
+        timer.log(prompt, response_text, model, usage)
+
+        if use_cache:
+            _cache_store(cache_key, response_text, model)
+    except BaseException as e:
+        timer.log(prompt, "".join(chunks), model, usage, error=repr(e))
+        if use_cache:
+            _flight.end(cache_key, future, error=e)
+        raise
+
     if use_cache:
-        # Load cache again to avoid overwrites
-        cache = {}
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, "r", encoding="utf-8") as f:
-                    cache = json.load(f)
-            except:
-                pass
-
-        # Add to cache and save
-        cache[prompt] = response_text
-        try:
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump(cache, f)
-        except Exception as e:
-            logger.error(f"Failed to save cache: {e}")
+        _flight.end(cache_key, future, response_text)
 
-    return response_text
+
+async def acall_llm_stream(prompt: str, use_cache: bool = True, timeout: float = None,
+                           cache_key: str = None, system_instruction: str = None):
+    """Async variant of call_llm_stream"""
+    start = time.perf_counter()
+    model = get_model()
+    cache_key = _make_key(prompt, model, cache_key, system_instruction)
+
+    if use_cache:
+        cached = await asyncio.to_thread(_cache_lookup, cache_key)
+        if cached is not None:
+            _log_cache_hit(prompt, cached, model, start)
+            yield cached
+            return
+
+        # Waiting followers are shielded: cancelling one never cancels the shared result
+        outcome, is_leader = await _flight.ajoin(cache_key)
+        if not is_leader:
+            yield outcome
+            return
+        future = outcome
+
+    timer = _StreamTimer()
+    usage = {}
+    chunks = []
+    try:
+        async for chunk in get_rate_limiter().astream(
+                lambda: get_provider().agenerate_stream(prompt, timeout, usage, system_instruction),
+                estimate_tokens(prompt, system_instruction), usage):
+            timer.chunk()
+            chunks.append(chunk)
+            yield chunk
+        response_text = "".join(chunks)
+        timer.log(prompt, response_text, model, usage)
+
+        if use_cache:
+            await asyncio.to_thread(_cache_store, cache_key, response_text, model)
+    except BaseException as e:
+        timer.log(prompt, "".join(chunks), model, usage, error=repr(e))
+        if use_cache:
+            _flight.end(cache_key, future, error=e)
+        raise
+
+    if use_cache:
+        _flight.end(cache_key, future, response_text)
+
+
+def get_cache_stats():
+    """Return LLM cache hit/miss/eviction counters"""
+    return get_cache().stats()
+
+
+def get_llm_stats():
+    """Return cache counters, in-flight request coalescing counters and rate limiter state"""
+    return {
+        "cache": get_cache_stats(),
+        "single_flight": _flight.stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+    }
 
 
 if __name__ == "__main__":
@@ -105,4 +269,4 @@ if __name__ == "__main__":
     # First call - should hit the API
     print("Making call...")
     response1 = call_llm(test_prompt, use_cache=False)
-    print(f"Response: {response1}")
\ No newline at end of file
+    print(f"Response: {response1}")
@@ -0,0 +1,250 @@
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+try:
+    from .question_sets import DIMENSIONS
+    from .sqlite_store import SQLiteStore
+    from .mbti_scoring import traditional_mbti_score, determine_mbti_type, normalize_response
+except ImportError:  # run as a script
+    from question_sets import DIMENSIONS
+    from sqlite_store import SQLiteStore
+    from mbti_scoring import traditional_mbti_score, determine_mbti_type, normalize_response
+
+DEFAULT_STATS_PATH = os.path.join(tempfile.gettempdir(), "mbti_cohort_stats.sqlite3")
+
+
+class CohortStats:
+    """Mergeable running statistics for a group of results.
+
+    Holds the type histogram, per-dimension count/mean/M2 (Welford, merged
+    with Chan's formula so buckets combine exactly) and per-question answer
+    histograms. Adding one result or merging two groups is O(questions).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.types = {}
+        self.dimensions = {d: [0, 0.0, 0.0] for d in DIMENSIONS}  # n, mean, M2
+        self.questions = {}  # question id -> counts of answers 1-5
+
+    def add(self, mbti_type, scores, responses):
+        self.count += 1
+        self.types[mbti_type] = self.types.get(mbti_type, 0) + 1
+        for dimension, moments in self.dimensions.items():
+            value = scores.get(f'{dimension}_score', 0.5)
+            moments[0] += 1
+            delta = value - moments[1]
+            moments[1] += delta / moments[0]
+            moments[2] += delta * (value - moments[1])
+        for question_id, response in responses.items():
+            histogram = self.questions.setdefault(int(question_id), [0] * 5)
+            histogram[normalize_response(response) - 1] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        for mbti_type, count in other.types.items():
+            self.types[mbti_type] = self.types.get(mbti_type, 0) + count
+        for dimension, (n_b, mean_b, m2_b) in other.dimensions.items():
+            n_a, mean_a, m2_a = self.dimensions[dimension]
+            n = n_a + n_b
+            if n_b:
+                delta = mean_b - mean_a
+                self.dimensions[dimension] = [n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n]
+        for question_id, counts in other.questions.items():
+            histogram = self.questions.setdefault(question_id, [0] * 5)
+            for index, count in enumerate(counts):
+                histogram[index] += count
+        return self
+
+    def to_dict(self):
+        return {"count": self.count, "types": self.types, "dimensions": self.dimensions,
+                "questions": {str(q_id): counts for q_id, counts in self.questions.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data["count"]
+        stats.types = dict(data["types"])
+        stats.dimensions.update({d: list(moments) for d, moments in data["dimensions"].items()})
+        stats.questions = {int(q_id): list(counts) for q_id, counts in data["questions"].items()}
+        return stats
+
+    def summary(self, include_questions=False):
+        """Plain dict of the type distribution, dimension mean/variance and (optionally) answer histograms"""
+        result = {
+            "count": self.count,
+            "types": {t: {"count": c, "share": c / self.count}
+                      for t, c in sorted(self.types.items(), key=lambda item: (-item[1], item[0]))},
+            "dimensions": {d: {"mean": mean, "variance": m2 / n if n else 0.0}
+                           for d, (n, mean, m2) in self.dimensions.items()},
+        }
+        if include_questions:
+            result["questions"] = {}
+            for q_id, counts in sorted(self.questions.items()):
+                answered = sum(counts)
+                result["questions"][q_id] = {
+                    "counts": dict(zip(range(1, 6), counts)),
+                    "mean": sum(value * count for value, count in enumerate(counts, 1)) / answered if answered else None,
+                }
+        return result
+
+
+def bucket_for(timestamp=None):
+    """Daily bucket (UTC date) for an ISO timestamp or datetime, defaulting to now"""
+    if timestamp is None:
+        moment = datetime.now(timezone.utc)
+    elif isinstance(timestamp, datetime):
+        moment = timestamp
+    else:
+        moment = datetime.fromisoformat(timestamp)
+    # Naive timestamps (as the exports write them) are local time
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%d")
+
+
+class CohortStore(SQLiteStore):
+    """Daily CohortStats buckets in SQLite (WAL, so the app, CLI and MCP server can share it)"""
+
+    isolation_level = None  # merges run in explicit BEGIN IMMEDIATE transactions
+
+    def __init__(self, path=DEFAULT_STATS_PATH):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cohort_buckets ("
+                " bucket TEXT PRIMARY KEY,"
+                " stats TEXT NOT NULL)"
+            )
+
+    def _merge_into(self, conn, bucket, stats):
+        row = conn.execute("SELECT stats FROM cohort_buckets WHERE bucket = ?", (bucket,)).fetchone()
+        if row is not None:
+            stats = CohortStats.from_dict(json.loads(row[0])).merge(stats)
+        conn.execute("INSERT OR REPLACE INTO cohort_buckets (bucket, stats) VALUES (?, ?)",
+                     (bucket, json.dumps(stats.to_dict())))
+
+    def record(self, mbti_type, scores, responses, timestamp=None):
+        """Add one finished result to its day's bucket"""
+        stats = CohortStats()
+        stats.add(mbti_type, scores, responses)
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front, so concurrent recorders can't lose updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._merge_into(conn, bucket_for(timestamp), stats)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, items):
+        """Replace every bucket from (timestamp, mbti_type, scores, responses) items in one pass"""
+        buckets = {}
+        for timestamp, mbti_type, scores, responses in items:
+            buckets.setdefault(bucket_for(timestamp), CohortStats()).add(mbti_type, scores, responses)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cohort_buckets")
+            conn.executemany("INSERT INTO cohort_buckets (bucket, stats) VALUES (?, ?)",
+                             [(bucket, json.dumps(stats.to_dict())) for bucket, stats in buckets.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return sum(stats.count for stats in buckets.values())
+
+    def query(self, since=None, until=None, include_questions=False):
+        """Merged summary of the buckets from since to until (inclusive YYYY-MM-DD, open-ended if None),
+        plus the result count of each bucket"""
+        rows = self._connect().execute(
+            "SELECT bucket, stats FROM cohort_buckets WHERE bucket >= ? AND bucket <= ? ORDER BY bucket",
+            (since or "", until or "9999-12-31")).fetchall()
+        total = CohortStats()
+        per_bucket = {}
+        for bucket, data in rows:
+            stats = CohortStats.from_dict(json.loads(data))
+            per_bucket[bucket] = stats.count
+            total.merge(stats)
+        result = total.summary(include_questions)
+        result.update({"since": since, "until": until, "buckets": per_bucket})
+        return result
+
+    def query_days(self, days=7, include_questions=False):
+        """Summary of the last `days` days, today included"""
+        today = datetime.now(timezone.utc).date()
+        return self.query((today - timedelta(days=days - 1)).isoformat(), today.isoformat(), include_questions)
+
+
+def iter_archive(path=None):
+    """Yield (timestamp, mbti_type, scores, responses) for archived results.
+
+    path is an export directory (mbti_questionnaire_*.json files) or a JSONL
+    file; None reads the exports in the temp directory. Only ExportDataNode
+    exports (records with results) count, as only those are recorded as
+    they happen: the app's saved questionnaires share the file pattern but
+    would count a user twice. Unreadable records are skipped, and scores
+    are recomputed. Each result is dated by exported_at, else created_at,
+    else the file's modification time.
+    """
+    try:
+        from .questionnaire import iter_questionnaires
+    except ImportError:  # run as a script
+        from questionnaire import iter_questionnaires
+
+    for item in iter_questionnaires(tempfile.gettempdir() if path is None else path):
+        if "error" in item:
+            print(f"Skipping {item['id']}: {item['error']}")
+            continue
+        if not item.get("results") or not item["responses"]:
+            continue
+        metadata = item.get("metadata", {})
+        timestamp = metadata.get("exported_at") or metadata.get("created_at") or item.get("modified_at")
+        responses = item["responses"]
+        scores = traditional_mbti_score(responses, item["questions"])
+        yield timestamp, determine_mbti_type(scores), scores, responses
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cohort_store():
+    """Return the process-wide cohort store (COHORT_STATS_PATH), creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CohortStore(path=os.getenv("COHORT_STATS_PATH", DEFAULT_STATS_PATH))
+    return _store
+
+
+if __name__ == "__main__":
+    # Record generated results into a scratch store and check merged moments
+    import time
+    from test_data import generate_test_data
+
+    test_path = os.path.join(tempfile.gettempdir(), "mbti_cohort_test.sqlite3")
+    if os.path.exists(test_path):
+        os.remove(test_path)
+    store = CohortStore(test_path)
+
+    results = []
+    for i, data in enumerate(generate_test_data(count=300, questions=40)):
+        scores = traditional_mbti_score(data["responses"], 40)
+        timestamp = (datetime.now(timezone.utc) - timedelta(days=i % 10)).isoformat()
+        results.append((timestamp, determine_mbti_type(scores), scores, data["responses"]))
+        store.record(*results[-1][1:], timestamp=timestamp)
+
+    started = time.perf_counter()
+    summary = store.query()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    values = [scores['E_score'] for _, _, scores, _ in results]
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / len(values)
+    print(f"{summary['count']} results in {len(summary['buckets'])} buckets, query {elapsed_ms:.1f}ms")
+    print(f"E mean {summary['dimensions']['E']['mean']:.6f} vs {mean:.6f}, "
+          f"variance {summary['dimensions']['E']['variance']:.6f} vs {variance:.6f}")
+    print(f"Last 7 days: {store.query_days(7)['count']}, rebuild: {store.rebuild(results)} results")
@@ -0,0 +1,88 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+DEFAULT_DEADLINE_SECONDS = 60.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """The caller stopped waiting; the work itself keeps running in the background"""
+
+
+def get_deadline():
+    """End-to-end seconds allowed for the LLM analysis step (LLM_DEADLINE, 0 disables)"""
+    deadline = float(os.getenv("LLM_DEADLINE", DEFAULT_DEADLINE_SECONDS))
+    return deadline if deadline > 0 else None
+
+
+# Sync calls that outlive their deadline finish on these threads and still fill the cache
+_executor = None
+_slots = None  # bounds running plus queued calls, so a stalled upstream can't grow the queue
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.getenv("LLM_DEADLINE_WORKERS", 32))
+                _slots = threading.BoundedSemaphore(2 * workers)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-deadline")
+    return _executor
+
+
+def run_with_deadline(fn, timeout):
+    """Call fn() on a background thread, waiting at most timeout seconds for its result.
+
+    fn must not depend on variables the caller changes afterwards (bind
+    arguments with functools.partial): it may run after the caller moved on.
+    When too many earlier calls are still outstanding, the wait for a free
+    slot counts against the same timeout.
+    """
+    if timeout is None:
+        return fn()
+    if timeout <= 0:
+        raise DeadlineExceeded("deadline already passed")
+    executor = _get_executor()
+    started = time.monotonic()
+    if not _slots.acquire(timeout=timeout):
+        raise DeadlineExceeded(f"no free background slot within {timeout:.1f}s")
+    try:
+        future = executor.submit(fn)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=max(0.0, timeout - (time.monotonic() - started)))
+    except FutureTimeoutError:
+        raise DeadlineExceeded(f"no result within {timeout:.1f}s") from None
+
+
+# Strong references so asyncio doesn't garbage-collect abandoned tasks mid-flight
+_background_tasks = set()
+
+
+async def arun_with_deadline(coro, timeout):
+    """Await coro for at most timeout seconds.
+
+    On expiry the coroutine keeps running as a background task (so its
+    result still lands in the cache); cancelling the caller cancels it too.
+    """
+    if timeout is None:
+        return await coro
+    task = asyncio.ensure_future(coro)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(timeout, 0))
+    except asyncio.TimeoutError:
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        # Nobody awaits it any more; retrieve a late failure so asyncio doesn't warn
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise DeadlineExceeded(f"no result within {timeout:.1f}s") from None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -0,0 +1,156 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+
+try:
+    from .sqlite_store import SQLiteStore
+except ImportError:  # run as a script
+    from sqlite_store import SQLiteStore
+
+# Cache configuration - use temp directory for HF Spaces
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "llm_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # 0 disables expiry
+
+
+def make_cache_key(prompt, model):
+    """Hash prompt and model name into a fixed-size cache key"""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMCache(SQLiteStore):
+    """Bounded SQLite cache for LLM responses with LRU and TTL eviction.
+
+    Lookups go through the primary key index, writes are single
+    transactions (safe across threads and processes thanks to WAL mode),
+    and the table is trimmed back to max_entries by least recent access.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        super().__init__(path, ("hits", "misses", "writes", "evictions", "expirations"))
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            self._count("misses")
+            return None
+
+        response, created_at = row
+        if self.ttl_seconds and now - created_at > self.ttl_seconds:
+            with conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._count("expirations")
+            self._count("misses")
+            return None
+
+        with conn:
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return response
+
+    def set(self, key, response, model=""):
+        """Store a response and evict least recently used entries over the cap"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            evicted = 0
+            if self.max_entries:
+                evicted = conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        self._count("writes")
+        if evicted > 0:
+            self._count("evictions", evicted)
+
+    def purge_expired(self):
+        """Delete every entry older than the TTL, returning how many were removed"""
+        if not self.ttl_seconds:
+            return 0
+        conn = self._connect()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        self._count("expirations", removed)
+        return removed
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss/eviction counters plus current size"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["entries"] = len(self)
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide LLM cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                )
+    return _cache
+
+
+if __name__ == "__main__":
+    # Test the cache against a scratch database
+    test_path = os.path.join(tempfile.gettempdir(), "llm_cache_test.sqlite3")
+    if os.path.exists(test_path):
+        os.remove(test_path)
+
+    cache = LLMCache(path=test_path, max_entries=3)
+    for i in range(5):
+        cache.set(make_cache_key(f"prompt {i}", "test-model"), f"response {i}", "test-model")
+    print(f"Oldest entry evicted: {cache.get(make_cache_key('prompt 0', 'test-model')) is None}")
+    print(f"Newest entry kept: {cache.get(make_cache_key('prompt 4', 'test-model'))}")
+    print(f"Stats: {cache.stats()}")
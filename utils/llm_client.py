@@ -0,0 +1,73 @@
+import os
+import threading
+
+import httpx
+from google import genai
+from google.genai import types
+
+# Connection pool configuration
+DEFAULT_POOL_SIZE = 10
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # seconds an idle connection is kept open
+DEFAULT_TIMEOUT = 120.0  # seconds per request
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_request_timeout():
+    """Default per-request timeout in seconds"""
+    return float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def _pool_limits():
+    pool_size = int(os.getenv("LLM_POOL_SIZE", DEFAULT_POOL_SIZE))
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+    )
+
+
+def get_client():
+    """Return the process-wide Gemini client, creating it on first use.
+
+    The client owns keep-alive HTTP connection pools (sync and async) that
+    are safe to share across threads, so every call after the first skips
+    TCP and TLS setup.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                limits = _pool_limits()
+                # For Vertex AI use vertexai=True with
+                # project=os.getenv("GEMINI_PROJECT_ID") and
+                # location=os.getenv("GEMINI_LOCATION", "us-central1") instead
+                _client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY", ""),
+                    http_options=types.HttpOptions(
+                        timeout=int(get_request_timeout() * 1000),
+                        client_args={"limits": limits},
+                        async_client_args={"limits": limits},
+                    ),
+                )
+    return _client
+
+
+def request_config(timeout=None, system_instruction=None):
+    """Build a per-request config overriding the client timeout and/or adding a system instruction"""
+    if timeout is None and system_instruction is None:
+        return None
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout is not None else None,
+    )
+
+
+def close_client():
+    """Close pooled connections (the next get_client() call reconnects)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Log configuration (override with LLM_LOG_* environment variables)
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 7
+DEFAULT_ROTATE_HOURS = 24.0
+DEFAULT_MAX_CHARS = 2000  # prompt/response characters kept per record, 0 keeps none
+DEFAULT_SAMPLE_RATE = 1.0  # fraction of records that carry prompt/response text
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotate when the file exceeds max_bytes or every interval_seconds, whichever comes first"""
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 interval_seconds=DEFAULT_ROTATE_HOURS * 3600):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval_seconds = interval_seconds
+        self.rollover_at = time.time() + interval_seconds
+
+    def shouldRollover(self, record):
+        if self.interval_seconds and time.time() >= self.rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval_seconds
+
+
+class JSONLineFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event plus the record's llm fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "llm", {}))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_logger = None
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def get_llm_logger():
+    """Return the LLM logger; records are queued and written by a background thread"""
+    global _logger, _listener
+    if _logger is None:
+        with _setup_lock:
+            if _logger is None:
+                log_directory = os.getenv("LOG_DIR", "logs")
+                os.makedirs(log_directory, exist_ok=True)
+                file_handler = SizeAndTimeRotatingFileHandler(
+                    os.path.join(log_directory, "llm_calls.jsonl"),
+                    max_bytes=int(os.getenv("LLM_LOG_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                    backup_count=int(os.getenv("LLM_LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT)),
+                    interval_seconds=float(os.getenv("LLM_LOG_ROTATE_HOURS", DEFAULT_ROTATE_HOURS)) * 3600,
+                )
+                file_handler.setFormatter(JSONLineFormatter())
+
+                log_queue = queue.SimpleQueue()
+                _listener = QueueListener(log_queue, file_handler)
+                _listener.start()
+                atexit.register(shutdown_llm_log)
+
+                logger = logging.getLogger("llm_logger")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False  # Prevent propagation to root logger
+                logger.addHandler(QueueHandler(log_queue))
+                _logger = logger
+    return _logger
+
+
+def shutdown_llm_log():
+    """Flush queued records and stop the background writer"""
+    global _logger, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+            for handler in _listener.handlers:
+                handler.close()
+        _logger, _listener = None, None
+
+
+def _clip(text, max_chars):
+    if text is None or max_chars <= 0:
+        return None
+    return text if len(text) <= max_chars else text[:max_chars] + f"... [{len(text) - max_chars} chars truncated]"
+
+
+def log_llm_call(event, prompt=None, response=None, model=None, latency=None, cache_hit=False,
+                 ttft=None, prompt_tokens=None, response_tokens=None, error=None, level=logging.INFO):
+    """Queue one structured performance record for an LLM call.
+
+    Text fields are truncated to LLM_LOG_MAX_CHARS and only attached to a
+    LLM_LOG_SAMPLE_RATE fraction of records; sizes and timings always are.
+    """
+    fields = {
+        "model": model,
+        "cache_hit": cache_hit,
+        "latency_s": round(latency, 4) if latency is not None else None,
+        "ttft_s": round(ttft, 4) if ttft is not None else None,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "prompt_chars": len(prompt) if prompt is not None else None,
+        "response_chars": len(response) if response is not None else None,
+    }
+    if error is not None:
+        fields["error"] = str(error)
+
+    if random.random() < float(os.getenv("LLM_LOG_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)):
+        max_chars = int(os.getenv("LLM_LOG_MAX_CHARS", DEFAULT_MAX_CHARS))
+        fields["prompt"] = _clip(prompt, max_chars)
+        fields["response"] = _clip(response, max_chars)
+
+    get_llm_logger().log(level, event, extra={"llm": fields})
+
+
+if __name__ == "__main__":
+    # Test the background writer
+    log_llm_call("call", prompt="Hello " * 1000, response="Hi there", model="test-model",
+                 latency=0.42, ttft=0.1, prompt_tokens=1000, response_tokens=2)
+    shutdown_llm_log()
+    with open(os.path.join(os.getenv("LOG_DIR", "logs"), "llm_calls.jsonl"), encoding="utf-8") as f:
+        print(f.readlines()[-1])
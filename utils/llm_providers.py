@@ -0,0 +1,322 @@
+import os
+import re
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+from google.genai import errors as genai_errors
+
+from .llm_client import get_client, request_config
+
+# Stub backend defaults (override with LLM_STUB_* environment variables)
+DEFAULT_STUB_LATENCY_MS = 800.0  # time to first token
+DEFAULT_STUB_JITTER_MS = 200.0
+DEFAULT_STUB_TOKENS_PER_SEC = 150.0
+DEFAULT_STUB_PREFILL_TOKENS_PER_SEC = 0.0  # prompt processing speed, 0 makes input size free
+STUB_CHUNK_TOKENS = 20  # tokens per streamed chunk, roughly what Gemini sends
+
+
+class LLMProviderError(Exception):
+    """Provider call failed; status carries the HTTP-style code when known and
+    retry_after the server's suggested wait in seconds"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LLMProvider:
+    """Interface every LLM backend implements (sync, async and streaming).
+
+    Every method accepts an optional usage dict that is filled with
+    prompt_tokens and response_tokens once the call completes, and an
+    optional system_instruction sent alongside the prompt.
+    """
+
+    name = "base"
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        raise NotImplementedError
+
+    def generate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        raise NotImplementedError
+
+    async def agenerate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        raise NotImplementedError
+
+    async def agenerate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        raise NotImplementedError
+        yield
+
+
+def _record_usage(usage, usage_metadata):
+    # Streamed responses repeat running totals, so the last chunk wins
+    if usage is None or usage_metadata is None:
+        return
+    usage["prompt_tokens"] = usage_metadata.prompt_token_count
+    usage["response_tokens"] = usage_metadata.candidates_token_count
+
+
+def _retry_after(error):
+    """Suggested wait from a Retry-After header or a google.rpc.RetryInfo detail"""
+    headers = getattr(error.response, "headers", None) or {}
+    try:
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    details = error.details.get("error", error.details) if isinstance(error.details, dict) else {}
+    for detail in details.get("details", []) if isinstance(details, dict) else []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+def _provider_error(error):
+    return LLMProviderError(f"gemini: {error}", status=error.code, retry_after=_retry_after(error))
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through the pooled genai client"""
+
+    name = "gemini"
+
+    def __init__(self, model=None):
+        # pro was too slow and janky
+        super().__init__(model or os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+
+    # API errors are re-raised as LLMProviderError so the rate limiter sees status and Retry-After
+
+    def generate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        try:
+            response = get_client().models.generate_content(
+                model=self.model, contents=[prompt], config=request_config(timeout, system_instruction)
+            )
+        except genai_errors.APIError as e:
+            raise _provider_error(e) from e
+        _record_usage(usage, response.usage_metadata)
+        return response.text
+
+    def generate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        try:
+            for chunk in get_client().models.generate_content_stream(
+                model=self.model, contents=[prompt], config=request_config(timeout, system_instruction)
+            ):
+                _record_usage(usage, chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+        except genai_errors.APIError as e:
+            raise _provider_error(e) from e
+
+    async def agenerate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        try:
+            response = await get_client().aio.models.generate_content(
+                model=self.model, contents=[prompt], config=request_config(timeout, system_instruction)
+            )
+        except genai_errors.APIError as e:
+            raise _provider_error(e) from e
+        _record_usage(usage, response.usage_metadata)
+        return response.text
+
+    async def agenerate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        try:
+            async for chunk in await get_client().aio.models.generate_content_stream(
+                model=self.model, contents=[prompt], config=request_config(timeout, system_instruction)
+            ):
+                _record_usage(usage, chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+        except genai_errors.APIError as e:
+            raise _provider_error(e) from e
+
+
+class StubProvider(LLMProvider):
+    """Offline backend returning deterministic analyses with simulated timing.
+
+    Time to first token is drawn from a fixed, uniform, normal or lognormal
+    distribution, plus the input size over prefill_tokens_per_sec when set.
+    Output is then released at tokens_per_sec, and a fraction of calls
+    (error_rate) fail with a simulated 503. A call whose time to first token
+    exceeds its timeout waits out the timeout and fails like a client timeout.
+    """
+
+    name = "stub"
+
+    def __init__(self, model="stub", latency_ms=DEFAULT_STUB_LATENCY_MS, jitter_ms=DEFAULT_STUB_JITTER_MS,
+                 distribution="lognormal", tokens_per_sec=DEFAULT_STUB_TOKENS_PER_SEC, error_rate=0.0, seed=None,
+                 prefill_tokens_per_sec=DEFAULT_STUB_PREFILL_TOKENS_PER_SEC):
+        super().__init__(model)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw a time-to-first-token in seconds"""
+        mean, jitter = self.latency_ms, self.jitter_ms
+        with self._rng_lock:
+            # lognormal needs a positive mean, so a zero or negative one falls back to fixed
+            if self.distribution == "fixed" or jitter <= 0 or (self.distribution == "lognormal" and mean <= 0):
+                value = mean
+            elif self.distribution == "uniform":
+                value = self._rng.uniform(mean - jitter, mean + jitter)
+            elif self.distribution == "normal":
+                value = self._rng.gauss(mean, jitter)
+            else:
+                # lognormal with the requested mean and standard deviation
+                sigma2 = math.log(1 + (jitter / mean) ** 2)
+                mu = math.log(mean) - sigma2 / 2
+                value = self._rng.lognormvariate(mu, sigma2 ** 0.5)
+        return max(0.0, value) / 1000
+
+    def _maybe_fail(self):
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            raise LLMProviderError("stub: simulated 503 UNAVAILABLE", status=503)
+
+    def render(self, prompt):
+        """Deterministic markdown analysis derived from the prompt"""
+        type_match = re.search(r"\b([EI][SN][TF][JP])\b", prompt)
+        mbti_type = type_match.group(1) if type_match else "XXXX"
+        question_ids = sorted({int(q) for q in re.findall(r"\bQ(\d+)\b", prompt)})
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+        lines = [f"### Stub analysis for {mbti_type}", ""]
+        for i, q_id in enumerate(question_ids):
+            weight = int(digest[i % len(digest)], 16)
+            strength = "strongly supports" if weight > 7 else "is consistent with"
+            lines.append(f"- Your response to [Q{q_id}](#Q{q_id}) {strength} the {mbti_type} profile.")
+        lines += ["", f"*Deterministic stub output {digest[:12]}.*"]
+        return "\n".join(lines)
+
+    def _chunks(self, text):
+        words = text.split(" ")
+        for i in range(0, len(words), STUB_CHUNK_TOKENS):
+            piece = " ".join(words[i:i + STUB_CHUNK_TOKENS])
+            yield piece if i + STUB_CHUNK_TOKENS >= len(words) else piece + " "
+
+    def _chunk_delay(self, chunk):
+        return len(chunk.split()) / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    @staticmethod
+    def count_tokens(prompt, system_instruction=None):
+        """Whitespace-separated words stand in for tokens"""
+        return len(prompt.split()) + (len(system_instruction.split()) if system_instruction else 0)
+
+    def _first_token_delay(self, prompt, system_instruction):
+        delay = self.sample_latency()
+        if self.prefill_tokens_per_sec > 0:
+            delay += self.count_tokens(prompt, system_instruction) / self.prefill_tokens_per_sec
+        return delay
+
+    @staticmethod
+    def _check_timeout(delay, timeout):
+        # Called after sleeping min(delay, timeout), as a real client gives up at its timeout
+        if timeout is not None and delay > timeout:
+            raise LLMProviderError(f"stub: no response within the {timeout:.1f}s timeout")
+
+    def _record_usage(self, usage, prompt, system_instruction, text):
+        if usage is not None:
+            usage["prompt_tokens"] = self.count_tokens(prompt, system_instruction)
+            usage["response_tokens"] = len(text.split())
+
+    def generate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        return "".join(self.generate_stream(prompt, timeout, usage, system_instruction))
+
+    def generate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        delay = self._first_token_delay(prompt, system_instruction)
+        time.sleep(delay if timeout is None else min(delay, timeout))
+        self._check_timeout(delay, timeout)
+        self._maybe_fail()
+        text = self.render(prompt)
+        for chunk in self._chunks(text):
+            yield chunk
+            time.sleep(self._chunk_delay(chunk))
+        self._record_usage(usage, prompt, system_instruction, text)
+
+    async def agenerate(self, prompt, timeout=None, usage=None, system_instruction=None):
+        return "".join([chunk async for chunk in self.agenerate_stream(prompt, timeout, usage, system_instruction)])
+
+    async def agenerate_stream(self, prompt, timeout=None, usage=None, system_instruction=None):
+        delay = self._first_token_delay(prompt, system_instruction)
+        await asyncio.sleep(delay if timeout is None else min(delay, timeout))
+        self._check_timeout(delay, timeout)
+        self._maybe_fail()
+        text = self.render(prompt)
+        for chunk in self._chunks(text):
+            yield chunk
+            await asyncio.sleep(self._chunk_delay(chunk))
+        self._record_usage(usage, prompt, system_instruction, text)
+
+
+def create_provider(name=None):
+    """Build the provider selected by name or the LLM_PROVIDER env var"""
+    name = (name or os.getenv("LLM_PROVIDER", "gemini")).lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "stub":
+        seed = os.getenv("LLM_STUB_SEED")
+        return StubProvider(
+            latency_ms=float(os.getenv("LLM_STUB_LATENCY_MS", DEFAULT_STUB_LATENCY_MS)),
+            jitter_ms=float(os.getenv("LLM_STUB_JITTER_MS", DEFAULT_STUB_JITTER_MS)),
+            distribution=os.getenv("LLM_STUB_DISTRIBUTION", "lognormal"),
+            tokens_per_sec=float(os.getenv("LLM_STUB_TOKENS_PER_SEC", DEFAULT_STUB_TOKENS_PER_SEC)),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", 0.0)),
+            seed=int(seed) if seed else None,
+            prefill_tokens_per_sec=float(os.getenv("LLM_STUB_PREFILL_TOKENS_PER_SEC",
+                                                   DEFAULT_STUB_PREFILL_TOKENS_PER_SEC)),
+        )
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return the process-wide provider, creating it on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """Replace the process-wide provider (e.g. a tuned StubProvider for benchmarks)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+if __name__ == "__main__":
+    # Test the stub backend
+    stub = StubProvider(latency_ms=100, jitter_ms=20, tokens_per_sec=500)
+    start = time.perf_counter()
+    text = stub.generate("Analysis for INTJ type. Q1 (E): ... Q2 (E): ...")
+    print(text)
+    print(f"Took {time.perf_counter() - start:.3f}s")
+
+    # Zero mean with jitter no longer divides by zero; a slow call honours its timeout
+    print(f"Zero-mean lognormal latency: {StubProvider(latency_ms=0, jitter_ms=50).sample_latency()}")
+    try:
+        StubProvider(latency_ms=500, jitter_ms=0).generate("Q1", timeout=0.1)
+    except LLMProviderError as e:
+        print(f"Timed out as expected: {e}")
@@ -1,5 +1,20 @@
-def traditional_mbti_score(responses):
-    """Traditional MBTI scoring algorithm"""
+try:
+    from .question_sets import get_question_set, DIMENSION_PAIRS
+except ImportError:  # run as a script
+    from question_sets import get_question_set, DIMENSION_PAIRS
+
+RESPONSE_MAP = {
+    'strongly_disagree': 1, 'disagree': 2, 'neutral': 3,
+    'agree': 4, 'strongly_agree': 5
+}
+
+def traditional_mbti_score(responses, questions=None):
+    """Traditional MBTI scoring algorithm.
+
+    questions is the set the responses answer: a QuestionSet, a question
+    list or a built-in length (see utils/question_sets.py). None scores
+    against every built-in question (1-60).
+    """
     # Initialize scores for each dimension
     scores = {
         'E': 0, 'I': 0,  # Extraversion vs Introversion
@@ -8,44 +23,90 @@ def traditional_mbti_score(responses):
         'J': 0, 'P': 0   # Judging vs Perceiving
     }
     
-    # Import the actual question dimensions from questionnaire.py
-    from .questionnaire import load_questionnaire
-    questions = load_questionnaire()
-    question_dimensions = {q['id']: q['dimension'] for q in questions}
+    # Precompiled id -> dimension map from the question set registry
+    question_dimensions = get_question_set(questions).dimension_of
     
     # Score each response (1=Disagree, 2=Slightly Disagree, 3=Neutral, 4=Slightly Agree, 5=Agree)
     for question_id, response in responses.items():
         if question_id in question_dimensions:
             dimension = question_dimensions[question_id]
             
-            # Convert response to score (1-5 scale)
-            if isinstance(response, str):
-                response_map = {
-                    'strongly_disagree': 1, 'disagree': 2, 'neutral': 3,
-                    'agree': 4, 'strongly_agree': 5
-                }
-                score = response_map.get(response, 3)
-            else:
-                score = int(response)
-            
             # Add to dimension score
-            scores[dimension] += score
+            scores[dimension] += normalize_response(response)
     
-    # Calculate percentages for each dimension pair
+    return pair_scores(scores)
+
+def normalize_response(response):
+    """Normalize a raw answer (1-5 or a label like 'agree' or 'Strongly Agree') to an int in 1-5"""
+    if isinstance(response, str):
+        label = response.strip().lower().replace(' ', '_')
+        if label.isdigit():
+            return max(1, min(5, int(label)))
+        return RESPONSE_MAP.get(label, 3)
+    return max(1, min(5, int(response)))
+
+def pair_scores(sums):
+    """Turn per-dimension sums into the share of each dimension within its pair"""
     result = {}
-    pairs = [('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P')]
     
-    for dim1, dim2 in pairs:
-        total = scores[dim1] + scores[dim2]
+    for dim1, dim2 in DIMENSION_PAIRS:
+        total = sums[dim1] + sums[dim2]
         if total > 0:
-            result[f'{dim1}_score'] = scores[dim1] / total
-            result[f'{dim2}_score'] = scores[dim2] / total
+            result[f'{dim1}_score'] = sums[dim1] / total
+            result[f'{dim2}_score'] = sums[dim2] / total
         else:
             result[f'{dim1}_score'] = 0.5
             result[f'{dim2}_score'] = 0.5
     
     return result
 
+def confidence_scores(scores):
+    """Per-pair confidence: the gap between the two shares (as in DetermineMBTITypeNode)"""
+    return {f'{dim1}{dim2}_confidence': abs(scores.get(f'{dim1}_score', 0.5) - scores.get(f'{dim2}_score', 0.5))
+            for dim1, dim2 in DIMENSION_PAIRS}
+
+class IncrementalScorer:
+    """Running per-dimension sums for one questionnaire.
+
+    set() adds or changes an answer in O(1), and scores() gives the same
+    result as traditional_mbti_score over the answers so far.
+    """
+    
+    def __init__(self, questions=None, responses=None):
+        self.question_set = get_question_set(questions)
+        self.sums = {'E': 0, 'I': 0, 'S': 0, 'N': 0, 'T': 0, 'F': 0, 'J': 0, 'P': 0}
+        self.answers = {}
+        for question_id, response in (responses or {}).items():
+            self.set(question_id, response)
+    
+    def set(self, question_id, response):
+        """Record or change the answer to one question"""
+        dimension = self.question_set.dimension_of.get(question_id)
+        if dimension is None:
+            return
+        score = normalize_response(response)
+        self.sums[dimension] += score - self.answers.get(question_id, 0)
+        self.answers[question_id] = score
+    
+    def remove(self, question_id):
+        """Forget the answer to one question"""
+        score = self.answers.pop(question_id, None)
+        if score is not None:
+            self.sums[self.question_set.dimension_of[question_id]] -= score
+    
+    @property
+    def answered(self):
+        return len(self.answers)
+    
+    def scores(self):
+        return pair_scores(self.sums)
+    
+    def mbti_type(self):
+        return determine_mbti_type(self.scores())
+    
+    def confidence(self):
+        return confidence_scores(self.scores())
+
 def determine_mbti_type(scores):
     """Determine MBTI type from scores"""
     type_str = ""
@@ -76,4 +137,10 @@ if __name__ == "__main__":
     scores = traditional_mbti_score(test_responses)
     mbti_type = determine_mbti_type(scores)
     print(f"Scores: {scores}")
-    print(f"MBTI Type: {mbti_type}")
\ No newline at end of file
+    print(f"MBTI Type: {mbti_type}")
+    # Incremental scoring matches, including after a changed answer
+    scorer = IncrementalScorer(20)
+    for question_id, response in test_responses.items():
+        scorer.set(question_id, 1)
+        scorer.set(question_id, response)
+    print(f"Incremental: {scorer.mbti_type()}, matches: {scorer.scores() == scores}")
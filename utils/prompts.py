@@ -0,0 +1,157 @@
+import os
+
+try:
+    from .question_sets import get_question_set, DIMENSION_PAIRS
+    from .response_codec import encode_values, to_token
+except ImportError:  # run as a script
+    from question_sets import get_question_set, DIMENSION_PAIRS
+    from response_codec import encode_values, to_token
+
+# Bump when a template's wording changes; only that template's cache
+# entries are invalidated
+ANALYSIS_TEMPLATE_VERSION = "analysis-v1"
+COMPACT_TEMPLATE_VERSION = "analysis-compact-v1"
+
+PROMPT_FORMATS = ("verbose", "compact")
+
+RESPONSE_LABELS = {1: "Strongly Disagree", 2: "Disagree", 3: "Neutral",
+                   4: "Agree", 5: "Strongly Agree"}
+RESPONSE_CODES = {1: "SD", 2: "D", 3: "N", 4: "A", 5: "SA"}
+
+
+def response_vector(questions, responses):
+    """Responses ordered by the question set, unanswered questions as Neutral (3)"""
+    return tuple(int(responses.get(q_id, 3)) for q_id in get_question_set(questions).ids)
+
+
+def format_dimension_scores(traditional_scores):
+    """One 'E/I: I (60.0%)' line per dimension pair"""
+    dimension_info = []
+    for dim1, dim2 in DIMENSION_PAIRS:
+        score1 = traditional_scores.get(f'{dim1}_score', 0.5)
+        score2 = traditional_scores.get(f'{dim2}_score', 0.5)
+        stronger = dim1 if score1 > score2 else dim2
+        percentage = max(score1, score2) * 100
+        dimension_info.append(f"{dim1}/{dim2}: {stronger} ({percentage:.1f}%)")
+    return "\n".join(dimension_info)
+
+
+def format_responses(questions, responses):
+    """One line per question with its dimension and the chosen answer"""
+    formatted_responses = []
+    for q, response_val in zip(questions, response_vector(questions, responses)):
+        dimension = q.get('dimension', 'Unknown')
+        formatted_responses.append(f"Q{q['id']} ({dimension}): {q['text']} - **{RESPONSE_LABELS[response_val]}**")
+    return "\n".join(formatted_responses)
+
+
+def build_analysis_prompt(questions, responses, mbti_type, traditional_scores, subject="someone"):
+    """Build the LLM analysis prompt shared by the app, CLI and MCP server"""
+    return f"""
+You are analyzing MBTI questionnaire responses for {subject} determined to be {mbti_type} type.
+
+Here are their EXACT responses to each question:
+
+{format_responses(questions, responses)}
+
+Traditional scoring results:
+{format_dimension_scores(traditional_scores)}
+
+IMPORTANT: You have been provided with the complete set of questions and responses above. Please analyze these SPECIFIC responses.
+
+Provide a detailed analysis that:
+
+1. **Response Pattern Analysis**: Identify which responses strongly support the {mbti_type} determination and which might seem unexpected. Reference specific questions (e.g., "Q5 shows...", "Your response to Q12 indicates...").
+
+2. **Characteristic Alignment**: Explain how their responses align with typical {mbti_type} characteristics, citing specific questions as evidence.
+
+3. **Out-of-Character Responses**: Point out any responses that seem inconsistent with typical {mbti_type} patterns and provide possible explanations.
+
+4. **Behavioral Patterns**: Describe key behavioral patterns shown through their responses, referencing the relevant questions.
+
+5. **Strengths & Growth Areas**: Based on their specific responses, identify strengths they demonstrate and areas for potential growth.
+
+6. **Communication & Work Style**: Infer their communication and work preferences from their question responses.
+
+Must reference the actual questions provided above throughout your analysis using markdown anchor links like [Q1](#Q1), [Q2](#Q2), etc. This will create clickable links to the specific questions in the report. Do not make assumptions about questions not provided.
+"""
+
+
+# Static part of the compact format, sent once as the system instruction
+COMPACT_SYSTEM_INSTRUCTION = """You analyze MBTI questionnaire responses. The user message gives the determined type, the traditional dimension scores and every question grouped by the dimension it measures, as `Qn=CODE text` with codes SD=Strongly Disagree, D=Disagree, N=Neutral, A=Agree, SA=Strongly Agree.
+
+Analyze these SPECIFIC responses. Provide a detailed analysis that:
+
+1. **Response Pattern Analysis**: Identify which responses strongly support the type determination and which might seem unexpected. Reference specific questions (e.g., "Q5 shows...", "Your response to Q12 indicates...").
+
+2. **Characteristic Alignment**: Explain how their responses align with typical characteristics of the type, citing specific questions as evidence.
+
+3. **Out-of-Character Responses**: Point out any responses that seem inconsistent with typical patterns for the type and provide possible explanations.
+
+4. **Behavioral Patterns**: Describe key behavioral patterns shown through their responses, referencing the relevant questions.
+
+5. **Strengths & Growth Areas**: Based on their specific responses, identify strengths they demonstrate and areas for potential growth.
+
+6. **Communication & Work Style**: Infer their communication and work preferences from their question responses.
+
+Must reference the actual questions provided throughout your analysis using markdown anchor links like [Q1](#Q1), [Q2](#Q2), etc. This will create clickable links to the specific questions in the report. Do not make assumptions about questions not provided."""
+
+
+def build_compact_prompt(questions, responses, mbti_type, traditional_scores):
+    """Compact user message: items grouped by dimension with short response codes"""
+    by_dimension = {}
+    for q, response_val in zip(questions, response_vector(questions, responses)):
+        by_dimension.setdefault(q.get('dimension', '?'), []).append(
+            f"Q{q['id']}={RESPONSE_CODES[response_val]} {q['text']}")
+
+    lines = [f"Type: {mbti_type}", "Scores: " + "; ".join(format_dimension_scores(traditional_scores).split("\n"))]
+    for dim1, dim2 in DIMENSION_PAIRS:
+        for dim in (dim1, dim2):
+            if dim in by_dimension:
+                lines.append(f"[{dim}]")
+                lines.extend(by_dimension.pop(dim))
+    for dim, items in by_dimension.items():
+        lines.append(f"[{dim}]")
+        lines.extend(items)
+    return "\n".join(lines)
+
+
+def get_prompt_format():
+    """Prompt format selected by LLM_PROMPT_FORMAT (verbose or compact)"""
+    prompt_format = os.getenv("LLM_PROMPT_FORMAT", "verbose")
+    if prompt_format not in PROMPT_FORMATS:
+        raise ValueError(f"Unknown prompt format: {prompt_format}")
+    return prompt_format
+
+
+def build_analysis_request(questions, responses, mbti_type, traditional_scores, prompt_format=None):
+    """Return (prompt, system_instruction, template_version) for the chosen format"""
+    prompt_format = prompt_format or get_prompt_format()
+    if prompt_format == "compact":
+        return (build_compact_prompt(questions, responses, mbti_type, traditional_scores),
+                COMPACT_SYSTEM_INSTRUCTION, COMPACT_TEMPLATE_VERSION)
+    return (build_analysis_prompt(questions, responses, mbti_type, traditional_scores),
+            None, ANALYSIS_TEMPLATE_VERSION)
+
+
+def analysis_cache_key(questions, responses, mbti_type, template_version=ANALYSIS_TEMPLATE_VERSION):
+    """Canonical cache key for an analysis, independent of prompt whitespace or entry point.
+
+    call_llm combines it with the model name, so the full key is
+    (template version, packed response vector, type, model); the packed
+    vector (utils/response_codec.py) carries the question-set version.
+    """
+    packed = to_token(encode_values(response_vector(questions, responses), questions))
+    return f"{template_version}:{packed}:{mbti_type}"
+
+
+if __name__ == "__main__":
+    # Test prompt and key building
+    from questionnaire import load_questionnaire
+
+    questions = load_questionnaire()
+    responses = {q['id']: 4 for q in questions}
+    scores = {'E_score': 0.6, 'I_score': 0.4}
+    print(build_analysis_prompt(questions, responses, "ENTJ", scores)[:300])
+    print(f"Cache key: {analysis_cache_key(questions, responses, 'ENTJ')}")
+    print(build_compact_prompt(questions, responses, "ENTJ", scores)[:300])
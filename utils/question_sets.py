@@ -0,0 +1,125 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+
+try:
+    from .questionnaire import DEFAULT_QUESTIONS, FORTY_QUESTIONS, SIXTY_QUESTIONS
+except ImportError:  # run as a script
+    from questionnaire import DEFAULT_QUESTIONS, FORTY_QUESTIONS, SIXTY_QUESTIONS
+
+DIMENSIONS = ('E', 'I', 'S', 'N', 'T', 'F', 'J', 'P')
+DIMENSION_PAIRS = (('E', 'I'), ('S', 'N'), ('T', 'F'), ('J', 'P'))
+
+
+@dataclass(frozen=True)
+class QuestionSet:
+    """Precompiled, read-only view of a question set.
+
+    ids and dimensions are aligned by column; position maps an id to its
+    column, dimension_of an id to its dimension, and by_dimension a
+    dimension to the columns measuring it.
+    """
+    version: str
+    questions: tuple
+    ids: tuple
+    dimensions: tuple
+    position: MappingProxyType
+    dimension_of: MappingProxyType
+    by_dimension: MappingProxyType
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+
+def question_set_version(questions):
+    """Short content hash identifying a question set (ids, dimensions and wording)"""
+    canonical = json.dumps([[q['id'], q.get('dimension'), q['text']] for q in questions],
+                           ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def compile_question_set(questions):
+    """Build a QuestionSet from a list of question dicts"""
+    questions = tuple(questions)
+    ids = tuple(q['id'] for q in questions)
+    dimensions = tuple(q.get('dimension') for q in questions)
+    by_dimension = {d: [] for d in DIMENSIONS}
+    for column, dimension in enumerate(dimensions):
+        by_dimension.setdefault(dimension, []).append(column)
+    return QuestionSet(
+        version=question_set_version(questions),
+        questions=questions,
+        ids=ids,
+        dimensions=dimensions,
+        position=MappingProxyType({q_id: column for column, q_id in enumerate(ids)}),
+        dimension_of=MappingProxyType(dict(zip(ids, dimensions))),
+        by_dimension=MappingProxyType({d: tuple(columns) for d, columns in by_dimension.items()}),
+    )
+
+
+_lock = threading.Lock()
+_by_version = {}
+# Recently seen question lists by object identity, so repeat lookups of the
+# same list skip hashing; entries hold the list so its id stays unique
+_by_identity = OrderedDict()
+MAX_IDENTITY_ENTRIES = 256
+
+
+def register_question_set(questions):
+    """Compile and register a question set (e.g. one loaded from a file), returning the shared instance"""
+    question_set = compile_question_set(questions)
+    with _lock:
+        question_set = _by_version.setdefault(question_set.version, question_set)
+        _by_identity[id(questions)] = (questions, question_set)
+        if len(_by_identity) > MAX_IDENTITY_ENTRIES:
+            _by_identity.popitem(last=False)
+    return question_set
+
+
+# Built-in sets, compiled once at import
+BUILTIN_QUESTION_SETS = {length: register_question_set(questions) for length, questions in
+                         ((20, DEFAULT_QUESTIONS), (40, FORTY_QUESTIONS), (60, SIXTY_QUESTIONS))}
+# Every built-in question; the shorter sets are prefixes of it
+ALL_BUILTIN_QUESTIONS = BUILTIN_QUESTION_SETS[60]
+
+
+def builtin_questions_for(responses):
+    """Smallest built-in question set covering every answered question id"""
+    highest = max(responses, default=0)
+    for length, question_set in sorted(BUILTIN_QUESTION_SETS.items()):
+        if highest <= length:
+            return question_set
+    return BUILTIN_QUESTION_SETS[max(BUILTIN_QUESTION_SETS)]
+
+
+def get_question_set(questions=None):
+    """Resolve a QuestionSet from a QuestionSet, a question list, a built-in length or a version hash.
+
+    None means all built-in questions (1-60).
+    """
+    if questions is None:
+        return ALL_BUILTIN_QUESTIONS
+    if isinstance(questions, QuestionSet):
+        return questions
+    if isinstance(questions, int):
+        return BUILTIN_QUESTION_SETS[questions]
+    if isinstance(questions, str):
+        return _by_version[questions]
+    entry = _by_identity.get(id(questions))
+    if entry is not None and entry[0] is questions:
+        return entry[1]
+    return register_question_set(questions)
+
+
+if __name__ == "__main__":
+    # Show the built-in sets
+    for length, question_set in BUILTIN_QUESTION_SETS.items():
+        counts = {d: len(columns) for d, columns in question_set.by_dimension.items()}
+        print(f"{length} questions, version {question_set.version}: {counts}")
+    print(get_question_set(list(SIXTY_QUESTIONS)) is ALL_BUILTIN_QUESTIONS)
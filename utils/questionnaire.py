@@ -1,7 +1,11 @@
 import json
 import os
+import fnmatch
 from datetime import datetime
 
+# Files ExportDataNode and the app's partial saves write into the temp directory
+EXPORT_PATTERN = "mbti_questionnaire_*.json"
+
 # Base 20 questions - balanced across dimensions
 BASE_QUESTIONS = [
     # E/I questions (5 total)
@@ -114,10 +118,15 @@ def load_questionnaire(file_path=None, length=20):
     if file_path and os.path.exists(file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            # If loading from file, use the questions in the file
+            # If loading from file, use the questions in the file, compiled once
+            # into the question set registry for scoring and prompt building
+            from .question_sets import register_question_set
             if 'questionnaire' in data and 'questions' in data['questionnaire']:
-                return data['questionnaire']['questions']
-            return data.get('questions', get_questionnaire_by_length(length))
+                questions = data['questionnaire']['questions']
+            else:
+                questions = data.get('questions', get_questionnaire_by_length(length))
+            register_question_set(questions)
+            return questions
     return get_questionnaire_by_length(length)
 
 def save_questionnaire(questionnaire_data, file_path):
@@ -138,6 +147,74 @@ def save_questionnaire(questionnaire_data, file_path):
         print(f"Error saving questionnaire: {e}")
         return False
 
+def parse_submission(data, source_id):
+    """id/questions/responses/metadata/results from one stored or submitted questionnaire.
+
+    Accepts an ExportDataNode or app export, a bare {"id", "responses"}
+    object or a packed {"id", "response_code"} record. Answers are
+    normalized to 1-5; without embedded questions the smallest built-in
+    set covering every answered id is used. results is the stored
+    ExportDataNode result, None for any other record. Raises ValueError, TypeError
+    or AttributeError for malformed records.
+    """
+    try:
+        from .question_sets import builtin_questions_for
+        from .mbti_scoring import normalize_response
+        from .response_codec import decode_token
+    except ImportError:  # run as a script
+        from question_sets import builtin_questions_for
+        from mbti_scoring import normalize_response
+        from response_codec import decode_token
+
+    questionnaire = data.get('questionnaire', data)
+    questions = questionnaire.get('questions')
+    responses = {int(k): v for k, v in questionnaire.get('responses', {}).items()}
+    if not responses and data.get('response_code'):
+        questions, responses = decode_token(data['response_code'])
+    return {
+        "id": data.get('id', source_id),
+        "questions": questions or builtin_questions_for(responses),
+        "responses": {q_id: normalize_response(r) for q_id, r in responses.items()},
+        "metadata": data.get('metadata', {}),
+        "results": data.get('results')
+    }
+
+def _parse_or_error(load, source_id):
+    """parse_submission of load()'s JSON, or an {"id", "error"} record if it can't be read"""
+    try:
+        item = parse_submission(load(), source_id)
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        return {"id": source_id, "error": f"invalid submission: {e}"}
+    item["questions"] = list(item["questions"])
+    return item
+
+def iter_questionnaires(path, pattern=EXPORT_PATTERN):
+    """Yield exported questionnaires from a directory of JSON files matching pattern or a JSONL
+    file (JSON objects or response tokens, one per line).
+
+    Unreadable files and lines are yielded as {"id", "error"} records instead
+    of stopping the scan, as --batch does. Items read from a directory also
+    carry modified_at, the file's modification time.
+    """
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if fnmatch.fnmatch(name, pattern):
+                file_path = os.path.join(path, name)
+                def load(file_path=file_path):
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        return json.load(f)
+                item = _parse_or_error(load, name)
+                if "error" not in item:
+                    item["modified_at"] = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+                yield item
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    # A line is either a JSON object or a bare response token
+                    load = lambda line=line: json.loads(line) if line.lstrip().startswith('{') else {"response_code": line.strip()}
+                    yield _parse_or_error(load, f"{os.path.basename(path)}:{line_no}")
+
 if __name__ == "__main__":
     # Test the functions
     questions = load_questionnaire()
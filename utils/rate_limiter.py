@@ -0,0 +1,352 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+# Limiter defaults (override with LLM_* environment variables); the rate
+# defaults match Gemini 2.5 Flash paid tier 1 quotas
+DEFAULT_RPM = 1000.0
+DEFAULT_TPM = 1_000_000.0
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class TokenBucket:
+    """Refills at rate_per_minute; a reservation may overdraw it and waits out the debt"""
+
+    def __init__(self, rate_per_minute):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket, returning seconds to wait before using it"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate_per_minute / 60)
+        self.updated_at = now
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level * 60 / self.rate_per_minute)
+
+    def refund(self, amount):
+        """Return over-reserved amount (negative amounts charge the difference)"""
+        if self.rate_per_minute > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    """A queued acquire, woken from whichever thread frees a slot"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RateLimiter:
+    """Client-side limiter shared by every LLM call in the process.
+
+    Requests and tokens per minute are token buckets. Concurrency is capped by
+    an AIMD limit: +1 per window of successful calls, halved on throttling
+    (429/503). Retryable failures back off exponentially with full jitter.
+    A Retry-After hint pauses every caller, not just the one that got it.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 min_concurrency=1, max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiters = deque()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._counters = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0}
+
+    # Concurrency slots
+
+    def _try_take_slot(self):
+        if self._in_flight < max(self.min_concurrency, int(self._limit)):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wake_waiters(self):
+        # Called with the lock held: hand free slots to queued callers in FIFO order
+        while self._waiters and self._try_take_slot():
+            self._waiters.popleft().wake()
+
+    def _take_or_queue(self, loop=None):
+        with self._lock:
+            if not self._waiters and self._try_take_slot():
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter):
+        # A cancelled waiter either leaves the queue or gives back the slot it was handed
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                self._in_flight -= 1
+                self._wake_waiters()
+
+    def _reserve(self, tokens):
+        """Charge the buckets, returning seconds until the call may start"""
+        with self._lock:
+            now = time.monotonic()
+            self._counters["requests"] += 1
+            return max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now),
+                       self._paused_until - now)
+
+    def acquire(self, tokens=0):
+        """Block until a concurrency slot and rate budget are available"""
+        waiter = self._take_or_queue()
+        if waiter is not None:
+            waiter.event.wait()
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens=0):
+        """Async variant of acquire"""
+        waiter = self._take_or_queue(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+        try:
+            delay = self._reserve(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self, error=None, estimated_tokens=0, actual_tokens=None):
+        """Free the slot and feed the outcome into the AIMD limit"""
+        with self._lock:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                self.tokens.refund(estimated_tokens - actual_tokens)
+
+            status = getattr(error, "status", None)
+            if status in THROTTLE_STATUSES:
+                self._counters["throttled"] += 1
+                now = time.monotonic()
+                # One decrease per burst of rejections, not one per rejected call
+                if now - self._last_decrease > 1.0:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+                retry_after = getattr(error, "retry_after", None)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            elif error is None:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / max(self._limit, 1.0))
+            self._wake_waiters()
+
+    # Retries
+
+    def backoff(self, error, attempt):
+        """Seconds to wait before retry number attempt+1, or None if error is final"""
+        if getattr(error, "status", None) not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+            return None
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return min(self.backoff_max, retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _give_up(self, error, attempt):
+        delay = self.backoff(error, attempt)
+        with self._lock:
+            self._counters["retries" if delay is not None else "failures"] += 1
+        return delay
+
+    def call(self, fn, tokens=0, usage=None):
+        """Run fn() under the limiter, retrying throttled and transient failures.
+
+        usage, when fn fills it, corrects the token estimate with the real count.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(e, tokens, 0)
+                delay = self._give_up(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(None, tokens, (usage or {}).get("prompt_tokens"))
+            return result
+
+    async def acall(self, coro_fn, tokens=0, usage=None):
+        """Async variant of call"""
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                result = await coro_fn()
+            except Exception as e:
+                self.release(e, tokens, 0)
+                delay = self._give_up(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(None, tokens, (usage or {}).get("prompt_tokens"))
+            return result
+
+    def stream(self, stream_fn, tokens=0, usage=None):
+        """Iterate stream_fn() under the limiter; only failures before the first chunk are retried"""
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            started = False
+            try:
+                for chunk in stream_fn():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.release(e, tokens, 0)
+                delay = None if started else self._give_up(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(None, tokens, (usage or {}).get("prompt_tokens"))
+            return
+
+    async def astream(self, stream_fn, tokens=0, usage=None):
+        """Async variant of stream"""
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            started = False
+            try:
+                async for chunk in stream_fn():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.release(e, tokens, 0)
+                delay = None if started else self._give_up(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(None, tokens, (usage or {}).get("prompt_tokens"))
+            return
+
+    def stats(self):
+        """Current limits, queue depth and throttling counters"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "rpm": self.requests.rate_per_minute,
+                "tpm": self.tokens.rate_per_minute,
+                "concurrency_limit": max(self.min_concurrency, int(self._limit)),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "paused_for": round(max(0.0, self._paused_until - now), 3),
+                **self._counters,
+            }
+
+
+def estimate_tokens(*texts):
+    """Rough input token count (about 4 characters per token) used before the real count is known"""
+    return sum(len(text) for text in texts if text) // 4 + 1
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide limiter, configured from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE and LLM_BACKOFF_MAX (0 disables a rate limit)"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    rpm=float(os.getenv("LLM_RPM", DEFAULT_RPM)),
+                    tpm=float(os.getenv("LLM_TPM", DEFAULT_TPM)),
+                    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                    max_retries=int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                    backoff_base=float(os.getenv("LLM_BACKOFF_BASE", DEFAULT_BACKOFF_BASE)),
+                    backoff_max=float(os.getenv("LLM_BACKOFF_MAX", DEFAULT_BACKOFF_MAX)),
+                )
+    return _limiter
+
+
+if __name__ == "__main__":
+    # Test AIMD and backoff with simulated throttling
+    class Throttled(Exception):
+        status = 429
+        retry_after = None
+
+    limiter = RateLimiter(rpm=600, max_concurrency=8, backoff_base=0.05)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) % 3 == 0:
+            raise Throttled()
+        return "ok"
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: limiter.call(flaky), range(30)))
+    print(f"{results.count('ok')} ok after {len(calls)} attempts")
+    print(limiter.stats())
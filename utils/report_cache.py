@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+try:
+    from .sqlite_store import SQLiteStore
+except ImportError:  # run as a script
+    from sqlite_store import SQLiteStore
+
+# Reports live in the temp directory (HF Spaces compatible), indexed by content hash
+DEFAULT_INDEX_PATH = os.path.join(tempfile.gettempdir(), "mbti_report_index.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000  # 0 keeps every report
+
+# The analysis fields a report is rendered from
+REPORT_FIELDS = ("responses_data", "traditional_scores", "confidence_scores", "llm_analysis")
+
+
+def make_report_key(mbti_type, analysis, template_version, format="html"):
+    """Hash everything that goes into a report into a fixed-size key"""
+    payload = [template_version, format, mbti_type, {field: analysis.get(field) for field in REPORT_FIELDS}]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ReportCache(SQLiteStore):
+    """Content-addressed report files with a SQLite index (key -> path, size, last access).
+
+    A key that is already indexed and still on disk returns its path without
+    rendering or writing. Files are written atomically, and the least
+    recently accessed reports beyond max_entries are deleted.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, directory=None, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(path, ("hits", "misses", "writes", "evictions"))
+        self.directory = directory or tempfile.gettempdir()
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_index ("
+                " key TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_report_index_accessed ON report_index (accessed_at)")
+
+    def get(self, key):
+        """Return the path of the stored report for key, or None if it was never written or is gone"""
+        conn = self._connect()
+        row = conn.execute("SELECT path FROM report_index WHERE key = ?", (key,)).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            if row is not None:
+                # Deleted behind our back (e.g. temp directory cleanup)
+                with conn:
+                    conn.execute("DELETE FROM report_index WHERE key = ?", (key,))
+            self._count("misses")
+            return None
+
+        with conn:
+            conn.execute("UPDATE report_index SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        return row[0]
+
+    def put(self, key, filename, content):
+        """Write content under filename in the report directory, index it and return its path"""
+        path = os.path.join(self.directory, filename)
+        data = content.encode("utf-8")
+        # Write then rename, so concurrent readers never see a partial report
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO report_index (key, path, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, path, len(data), now, now)
+            )
+            evicted = []
+            if self.max_entries:
+                evicted = conn.execute(
+                    "SELECT key, path FROM report_index ORDER BY accessed_at DESC LIMIT -1 OFFSET ?",
+                    (self.max_entries,)
+                ).fetchall()
+                conn.executemany("DELETE FROM report_index WHERE key = ?", [(k,) for k, _ in evicted])
+        for _, evicted_path in evicted:
+            try:
+                os.remove(evicted_path)
+            except OSError:
+                pass
+        self._count("writes")
+        if evicted:
+            self._count("evictions", len(evicted))
+        return path
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM report_index").fetchone()[0]
+
+    def stats(self):
+        """Return hit/miss/write/eviction counters plus the number and total size of stored reports"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        entries, total_bytes = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM report_index").fetchone()
+        stats.update({"entries": entries, "bytes": total_bytes, "max_entries": self.max_entries})
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """Return the process-wide report cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ReportCache(
+                    path=os.getenv("REPORT_CACHE_PATH", DEFAULT_INDEX_PATH),
+                    max_entries=int(os.getenv("REPORT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                )
+    return _cache
+
+
+if __name__ == "__main__":
+    # Store reports in a scratch directory and check hits and eviction
+    test_dir = tempfile.mkdtemp(prefix="mbti_report_cache_test_")
+    cache = ReportCache(path=os.path.join(test_dir, "index.sqlite3"), directory=test_dir, max_entries=2)
+    keys = [make_report_key("INTJ", {"llm_analysis": f"analysis {i}"}, "test") for i in range(3)]
+    for i, key in enumerate(keys):
+        if cache.get(key) is None:
+            cache.put(key, f"report_{key[:16]}.html", f"<p>analysis {i}</p>")
+    print(f"Repeat hit: {cache.get(keys[2]) is not None}, oldest evicted: {cache.get(keys[0]) is None}")
+    print(f"Stats: {cache.stats()}")
@@ -1,10 +1,19 @@
 import os
+import hashlib
 from datetime import datetime
 try:
     import markdown
     MARKDOWN_AVAILABLE = True
 except ImportError:
     MARKDOWN_AVAILABLE = False
+try:
+    from .prompts import RESPONSE_LABELS, format_dimension_scores, response_vector
+    from .report_cache import get_report_cache, make_report_key
+    from .question_sets import DIMENSION_PAIRS
+except ImportError:  # run as a script
+    from prompts import RESPONSE_LABELS, format_dimension_scores, response_vector
+    from report_cache import get_report_cache, make_report_key
+    from question_sets import DIMENSION_PAIRS
 
 # MBTI Type descriptions based on 16personalities.com
 MBTI_DESCRIPTIONS = {
@@ -129,6 +138,42 @@ MBTI_DESCRIPTIONS = {
     }
 }
 
+OPPOSITE_DIMENSIONS = {'E': 'I', 'I': 'E', 'S': 'N', 'N': 'S', 'T': 'F', 'F': 'T', 'J': 'P', 'P': 'J'}
+
+def generate_fallback_analysis(questions, responses, mbti_type, traditional_scores, max_highlights=5):
+    """Instant markdown analysis built locally from the type description, scores and strongest answers.
+
+    Used when the LLM misses its deadline or fails; cites questions with the
+    same [Qn](#Qn) links as the LLM analysis.
+    """
+    type_info = MBTI_DESCRIPTIONS.get(mbti_type, {})
+    lines = [f"### {mbti_type} – {type_info.get('name', 'Unknown Type')}", ""]
+    if type_info.get("description"):
+        lines += [f"*{type_info['description']}*", ""]
+
+    lines.append("**Dimension scores**")
+    lines += [f"- {line}" for line in format_dimension_scores(traditional_scores).split("\n")]
+
+    # Most extreme answers first; ties keep questionnaire order
+    answered = [(q, int(responses[q['id']])) for q in questions if q['id'] in responses]
+    extreme = sorted((item for item in answered if item[1] != 3), key=lambda item: -abs(item[1] - 3))
+    if extreme:
+        lines += ["", "**Your most decisive answers**"]
+        for q, value in extreme[:max_highlights]:
+            dimension = q.get('dimension', '')
+            leaning = dimension if value > 3 else OPPOSITE_DIMENSIONS.get(dimension, '')
+            points_to = f" (points to {leaning})" if leaning else ""
+            lines.append(f"- [Q{q['id']}](#Q{q['id']}) {q['text']} – **{RESPONSE_LABELS[value]}**{points_to}")
+
+    if type_info:
+        lines += ["", f"**Strengths:** {', '.join(type_info['strengths'])}",
+                  f"**Growth areas:** {', '.join(type_info['weaknesses'])}",
+                  f"**Careers to explore:** {', '.join(type_info['careers'])}"]
+
+    lines += ["", "*The detailed AI analysis was not available in time, so this summary was generated "
+                  "from your scores. Run the analysis again shortly for the full version.*"]
+    return "\n".join(lines)
+
 def markdown_to_html(markdown_text):
     """Convert markdown to HTML"""
     if not markdown_text:
@@ -140,38 +185,64 @@ def markdown_to_html(markdown_text):
         # Fallback: just replace line breaks
         return markdown_text.replace('\n', '<br>')
 
+def build_responses_data(questions, responses):
+    """Per-question rows for the report's responses table (unanswered shown as Neutral)"""
+    return [{
+        'id': q['id'],
+        'text': q['text'],
+        'dimension': q.get('dimension', 'Unknown'),
+        'response': RESPONSE_LABELS[response_val],
+        'value': response_val
+    } for q, response_val in zip(questions, response_vector(questions, responses))]
+
+CELL_STYLE = "padding: 8px; border: 1px solid #ddd;"
+CENTERED_CELL_STYLE = CELL_STYLE + " text-align: center;"
+
 def generate_responses_html(responses_data):
     """Generate HTML for question responses"""
     if not responses_data:
         return "<p>No response data available.</p>"
     
-    html = "<table style='width: 100%; border-collapse: collapse;'>"
-    html += "<tr style='background: #f0f0f0;'><th style='padding: 8px; border: 1px solid #ddd;'>Question</th><th style='padding: 8px; border: 1px solid #ddd;'>Dimension</th><th style='padding: 8px; border: 1px solid #ddd;'>Response</th></tr>"
+    parts = ["<table style='width: 100%; border-collapse: collapse;'>",
+             f"<tr style='background: #f0f0f0;'><th style='{CELL_STYLE}'>Question</th><th style='{CELL_STYLE}'>Dimension</th><th style='{CELL_STYLE}'>Response</th></tr>"]
     
     for resp in responses_data:
-        html += f"<tr id='Q{resp['id']}'>"
-        html += f"<td style='padding: 8px; border: 1px solid #ddd;'><strong>Q{resp['id']}:</strong> {resp['text']}</td>"
-        html += f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'>{resp['dimension']}</td>"
-        html += f"<td style='padding: 8px; border: 1px solid #ddd; text-align: center;'><strong>{resp['response']}</strong></td>"
-        html += "</tr>"
+        parts.append(
+            f"<tr id='Q{resp['id']}'>"
+            f"<td style='{CELL_STYLE}'><strong>Q{resp['id']}:</strong> {resp['text']}</td>"
+            f"<td style='{CENTERED_CELL_STYLE}'>{resp['dimension']}</td>"
+            f"<td style='{CENTERED_CELL_STYLE}'><strong>{resp['response']}</strong></td>"
+            "</tr>")
     
-    html += "</table>"
-    return html
+    parts.append("</table>")
+    return "".join(parts)
 
-def generate_report(mbti_type, analysis, format="html"):
-    """Generate MBTI report in HTML or PDF format"""
-    
-    # Get type info
-    type_info = MBTI_DESCRIPTIONS.get(mbti_type, {
-        "name": "Unknown Type",
-        "description": "Type description not available.",
-        "strengths": ["To be determined"],
-        "weaknesses": ["To be determined"], 
-        "careers": ["Various options"]
-    })
-    
-    # Generate HTML content
-    html_content = f"""
+def generate_confidence_html(confidence_scores):
+    """Generate HTML for the bootstrap flip probability and interval of each dimension pair"""
+    if 'EI_flip_probability' not in (confidence_scores or {}):
+        return "<p>Bootstrap confidence not available.</p>"
+
+    parts = ["<table style='width: 100%; border-collapse: collapse;'>",
+             f"<tr style='background: #f0f0f0;'><th style='{CELL_STYLE}'>Pair</th><th style='{CELL_STYLE}'>First letter share (95% interval)</th><th style='{CELL_STYLE}'>Chance the letter flips</th></tr>"]
+
+    for dim1, dim2 in DIMENSION_PAIRS:
+        pair = f'{dim1}{dim2}'
+        parts.append(
+            "<tr>"
+            f"<td style='{CENTERED_CELL_STYLE}'><strong>{dim1}/{dim2}</strong></td>"
+            f"<td style='{CENTERED_CELL_STYLE}'>{dim1} {confidence_scores[f'{pair}_interval_low']:.0%} – {confidence_scores[f'{pair}_interval_high']:.0%}</td>"
+            f"<td style='{CENTERED_CELL_STYLE}'>{confidence_scores[f'{pair}_flip_probability']:.0%}</td>"
+            "</tr>")
+
+    parts.append("</table>")
+    return "".join(parts)
+
+# Per-request slots of the report, in document order; everything else is
+# fixed per type and rendered once by compile_report_template
+REPORT_SLOTS = ("responses", "scores", "confidence", "llm_analysis", "generated_at")
+_SLOT_MARKER = "\x00"
+
+REPORT_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -230,35 +301,35 @@ def generate_report(mbti_type, analysis, format="html"):
         <div class="header">
             <button class="theme-toggle" onclick="toggleTheme()">🌙 Dark</button>
             <h1>Your Personality Type <a target="_blank" rel="noopener noreferrer" href="https://huggingface.co/spaces/Fancellu/mbti-pocketflow">mbti-pocketflow<a/></h1>
-            <div class="type-badge">{mbti_type} - {type_info['name']}</div>
-            <p><em>{type_info['description']}</em></p>
+            <div class="type-badge">{mbti_type} - {type_name}</div>
+            <p><em>{type_description}</em></p>
         </div>
         
         <div class="section">
             <h2>Question Responses</h2>
             <div class="responses">
-                {generate_responses_html(analysis.get('responses_data', []))}
+                {responses}
             </div>
         </div>
         
         <div class="section">
             <h2>Strengths</h2>
             <ul>
-                {''.join([f'<li>{strength}</li>' for strength in type_info['strengths']])}
+                {strengths}
             </ul>
         </div>
         
         <div class="section">
             <h2>Areas for Growth</h2>
             <ul>
-                {''.join([f'<li>{weakness}</li>' for weakness in type_info['weaknesses']])}
+                {weaknesses}
             </ul>
         </div>
         
         <div class="section">
             <h2>Career Suggestions</h2>
             <ul>
-                {''.join([f'<li>{career}</li>' for career in type_info['careers']])}
+                {careers}
             </ul>
         </div>
         
@@ -266,15 +337,18 @@ def generate_report(mbti_type, analysis, format="html"):
             <h2>Analysis Details</h2>
             <div class="analysis">
                 <h3>Traditional Scoring</h3>
-                <p>Scores: {analysis.get('traditional_scores', 'Not available')}</p>
-                
+                <p>Scores: {scores}</p>
+
+                <h3>Score Stability</h3>
+                {confidence}
+
                 <h3>AI Analysis</h3>
-                <div>{markdown_to_html(analysis.get('llm_analysis', 'AI analysis not performed.'))}</div>
+                <div>{llm_analysis}</div>
             </div>
         </div>
         
         <div class="section">
-            <p><small>Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</small></p>
+            <p><small>Report generated on {generated_at}</small></p>
         </div>
         
         <script>
@@ -303,19 +377,153 @@ def generate_report(mbti_type, analysis, format="html"):
     </body>
     </html>
     """
-    
-    # Save report to temp directory for HF Spaces compatibility
-    import tempfile
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"mbti_report_{mbti_type}_{timestamp}.html"
-    
-    temp_dir = tempfile.gettempdir()
-    full_path = os.path.join(temp_dir, filename)
-    
-    with open(full_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
-    return full_path
+
+# Part of every report cache key, so template edits never serve stale reports
+REPORT_TEMPLATE_VERSION = hashlib.sha256(REPORT_TEMPLATE.encode("utf-8")).hexdigest()[:16]
+
+UNKNOWN_TYPE_INFO = {
+    "name": "Unknown Type",
+    "description": "Type description not available.",
+    "strengths": ["To be determined"],
+    "weaknesses": ["To be determined"],
+    "careers": ["Various options"]
+}
+
+def _type_lists(type_info):
+    return {key: ''.join(f'<li>{item}</li>' for item in type_info[key]) for key in ('strengths', 'weaknesses', 'careers')}
+
+def compile_report_template(mbti_type):
+    """Static HTML fragments of one type's report, to be interleaved with REPORT_SLOTS values"""
+    type_info = MBTI_DESCRIPTIONS.get(mbti_type, UNKNOWN_TYPE_INFO)
+    html = REPORT_TEMPLATE.format(
+        mbti_type=mbti_type,
+        type_name=type_info['name'],
+        type_description=type_info['description'],
+        **_type_lists(type_info),
+        **{slot: _SLOT_MARKER for slot in REPORT_SLOTS})
+    return tuple(html.split(_SLOT_MARKER))
+
+def compile_type_sections(mbti_type):
+    """The type-specific parts of a report as standalone HTML fragments, for embedding in the UI"""
+    type_info = MBTI_DESCRIPTIONS.get(mbti_type, UNKNOWN_TYPE_INFO)
+    lists = _type_lists(type_info)
+    return {
+        "badge": f'<div class="type-badge">{mbti_type} - {type_info["name"]}</div>',
+        "description": f'<p><em>{type_info["description"]}</em></p>',
+        "strengths": f'<div class="section"><h2>Strengths</h2><ul>{lists["strengths"]}</ul></div>',
+        "weaknesses": f'<div class="section"><h2>Areas for Growth</h2><ul>{lists["weaknesses"]}</ul></div>',
+        "careers": f'<div class="section"><h2>Career Suggestions</h2><ul>{lists["careers"]}</ul></div>',
+    }
+
+# All 16 types are compiled at import; other types on first use
+_REPORT_TEMPLATES = {mbti_type: compile_report_template(mbti_type) for mbti_type in MBTI_DESCRIPTIONS}
+_TYPE_SECTIONS = {mbti_type: compile_type_sections(mbti_type) for mbti_type in MBTI_DESCRIPTIONS}
+
+def _compiled(cache, compile, mbti_type):
+    compiled = cache.get(mbti_type)
+    if compiled is None:
+        compiled = cache[mbti_type] = compile(mbti_type)
+    return compiled
+
+def _slot_values(analysis, generated_at=None):
+    """Per-request fragments of a report, keyed by REPORT_SLOTS"""
+    return {
+        "responses": generate_responses_html(analysis.get('responses_data', [])),
+        "scores": str(analysis.get('traditional_scores', 'Not available')),
+        "confidence": generate_confidence_html(analysis.get('confidence_scores')),
+        "llm_analysis": markdown_to_html(analysis.get('llm_analysis', 'AI analysis not performed.')),
+        "generated_at": generated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def _fill_template(template, values):
+    parts = [template[0]]
+    for slot, fragment in zip(REPORT_SLOTS, template[1:]):
+        parts.append(values[slot])
+        parts.append(fragment)
+    return "".join(parts)
+
+def render_report(mbti_type, analysis, generated_at=None, template=None):
+    """Report HTML for a type and analysis, filling the type's precompiled template.
+
+    generated_at defaults to now; template overrides the compiled fragments
+    (bench.py passes a freshly compiled one for comparison).
+    """
+    if template is None:
+        template = _compiled(_REPORT_TEMPLATES, compile_report_template, mbti_type)
+    return _fill_template(template, _slot_values(analysis, generated_at))
+
+class Report:
+    """A report held in memory, rendered on first use.
+
+    sections has ready-made HTML fragments for the UI: badge, description,
+    responses, strengths, weaknesses, careers, scores, confidence,
+    llm_analysis and generated_at. html is the full document, and nothing
+    is written to disk until save(). A save() that hits the report cache
+    renders nothing at all.
+    """
+
+    def __init__(self, mbti_type, analysis, format="html", generated_at=None):
+        self.mbti_type = mbti_type
+        self.analysis = analysis
+        self.format = format
+        self.generated_at = generated_at
+        self.path = None
+        self._sections = None
+        self._html = None
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            sections = dict(_compiled(_TYPE_SECTIONS, compile_type_sections, self.mbti_type))
+            sections.update(_slot_values(self.analysis, self.generated_at))
+            self._sections = sections
+        return self._sections
+
+    @property
+    def html(self):
+        if self._html is None:
+            template = _compiled(_REPORT_TEMPLATES, compile_report_template, self.mbti_type)
+            self._html = _fill_template(template, self.sections)
+        return self._html
+
+    @property
+    def key(self):
+        return make_report_key(self.mbti_type, self.analysis, REPORT_TEMPLATE_VERSION, self.format)
+
+    def save(self, filename=None):
+        """Write the report to the temp directory (once) and return its path.
+
+        Without a filename the report is content-addressed: if identical
+        inputs were saved before, that file is returned without writing.
+        """
+        if self.path is not None and filename is None:
+            return self.path
+        if filename is None:
+            cache = get_report_cache()
+            key = self.key
+            # html is only rendered on a miss
+            self.path = cache.get(key) or cache.put(key, f"mbti_report_{self.mbti_type}_{key[:16]}.html", self.html)
+            return self.path
+
+        # Save report to temp directory for HF Spaces compatibility
+        import tempfile
+        full_path = os.path.join(tempfile.gettempdir(), filename)
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(self.html)
+        return full_path
+
+def build_report(mbti_type, analysis, format="html"):
+    """A report for these inputs, rendered lazily; call save() on the result to write it"""
+    return Report(mbti_type, analysis, format)
+
+def generate_report(mbti_type, analysis, format="html", filename=None):
+    """Generate MBTI report in HTML or PDF format and return its path.
+
+    Without a filename the report is content-addressed: identical inputs
+    return the existing file without rendering or writing it again. Bulk
+    callers pass their own filename to always write that file.
+    """
+    return build_report(mbti_type, analysis, format).save(filename)
 
 if __name__ == "__main__":
     # Test report generation
@@ -324,5 +532,7 @@ if __name__ == "__main__":
         'llm_analysis': 'This person shows strong analytical thinking patterns.'
     }
     
+    report = build_report("INTJ", test_analysis)
+    print(f"Report rendered in memory: {len(report.html)} characters, sections {sorted(report.sections)}")
     report_path = generate_report("INTJ", test_analysis)
-    print(f"Report generated: {report_path}")
\ No newline at end of file
+    print(f"Report generated: {report_path} (same as saved: {report.save() == report_path})")
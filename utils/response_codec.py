@@ -0,0 +1,153 @@
+import base64
+
+import numpy as np
+
+try:
+    from .question_sets import get_question_set, BUILTIN_QUESTION_SETS
+    from .mbti_scoring import normalize_response
+except ImportError:  # run as a script
+    from question_sets import get_question_set, BUILTIN_QUESTION_SETS
+    from mbti_scoring import normalize_response
+
+# Layout: one header byte (format in the high nibble, question set in the low
+# nibble), the 8-byte set version for non-built-in sets only, then 3 bits per
+# question in question-set order, little-endian. Code 0 means unanswered, so
+# 60 built-in answers take 1 + 23 = 24 bytes (32 characters as a token).
+FORMAT = 1
+CUSTOM_SET = 0
+BITS_PER_ANSWER = 3
+
+_BUILTIN_CODES = {question_set.version: code for code, question_set in
+                  enumerate((BUILTIN_QUESTION_SETS[length] for length in sorted(BUILTIN_QUESTION_SETS)), 1)}
+_BUILTIN_SETS = {code: version for version, code in _BUILTIN_CODES.items()}
+
+
+def _packed_size(count):
+    return (count * BITS_PER_ANSWER + 7) // 8
+
+
+def _header(question_set):
+    code = _BUILTIN_CODES.get(question_set.version, CUSTOM_SET)
+    header = bytes([FORMAT << 4 | code])
+    return header if code != CUSTOM_SET else header + bytes.fromhex(question_set.version)
+
+
+def encode_values(values, questions):
+    """Encode a vector of 0-5 codes (one per question, 0 = unanswered) for a question set"""
+    question_set = get_question_set(questions)
+    if len(values) != len(question_set):
+        raise ValueError(f"Expected {len(question_set)} answers, got {len(values)}")
+    packed = 0
+    for value in reversed(values):
+        packed = packed << BITS_PER_ANSWER | value
+    return _header(question_set) + packed.to_bytes(_packed_size(len(values)), "little")
+
+
+def encode_responses(responses, questions):
+    """Pack a {question_id: answer} dict; answers outside the question set are dropped"""
+    question_set = get_question_set(questions)
+    values = [responses.get(q_id) for q_id in question_set.ids]
+    # Valid ints pass straight through; anything else (labels, out of range) is normalized
+    return encode_values([0 if value is None else value if value.__class__ is int and 1 <= value <= 5
+                          else normalize_response(value) for value in values], question_set)
+
+
+def _split(data):
+    """(question_set, packed answer bytes) from an encoded value"""
+    if not data or data[0] >> 4 != FORMAT:
+        raise ValueError("Not an encoded response vector")
+    code = data[0] & 0x0F
+    if code == CUSTOM_SET:
+        version, body = data[1:9].hex(), data[9:]
+    elif code in _BUILTIN_SETS:
+        version, body = _BUILTIN_SETS[code], data[1:]
+    else:
+        raise ValueError(f"Unknown built-in question set code {code}")
+    try:
+        question_set = get_question_set(version)
+    except KeyError:
+        raise ValueError(f"Unknown question set version {version}") from None
+    if len(body) != _packed_size(len(question_set)):
+        raise ValueError(f"Encoded answers have {len(body)} bytes, expected {_packed_size(len(question_set))}")
+    return question_set, body
+
+
+def decode_values(data):
+    """(question_set, tuple of 0-5 codes in question order) from encode_values/encode_responses output"""
+    question_set, body = _split(data)
+    packed = int.from_bytes(body, "little")
+    mask = (1 << BITS_PER_ANSWER) - 1
+    values = tuple((packed >> (index * BITS_PER_ANSWER)) & mask for index in range(len(question_set)))
+    if max(values, default=0) > 5:
+        raise ValueError("Encoded answers out of range")
+    return question_set, values
+
+
+def decode_responses(data):
+    """(question_set, {question_id: answer}) with unanswered questions left out"""
+    question_set, values = decode_values(data)
+    return question_set, {q_id: value for q_id, value in zip(question_set.ids, values) if value}
+
+
+def decode_matrix(encoded, questions=None):
+    """Bulk-decode many encodings of one question set into an N x Q int8 matrix (0 = unanswered),
+    ready for batch_scoring.score_matrix"""
+    encoded = list(encoded)
+    if not encoded:
+        return np.zeros((0, len(get_question_set(questions))), dtype=np.int8)
+    question_set, body = _split(encoded[0])
+    if questions is not None and get_question_set(questions).version != question_set.version:
+        raise ValueError("Encoded answers belong to a different question set")
+    header = encoded[0][:len(encoded[0]) - len(body)]
+    if any(data[:len(header)] != header or len(data) != len(encoded[0]) for data in encoded):
+        raise ValueError("All encodings must share one question set")
+
+    raw = np.frombuffer(b"".join(encoded), dtype=np.uint8).reshape(len(encoded), -1)[:, len(header):]
+    bits = np.unpackbits(raw, axis=1, bitorder="little")[:, :len(question_set) * BITS_PER_ANSWER]
+    weights = (1 << np.arange(BITS_PER_ANSWER)).astype(np.int8)
+    matrix = bits.reshape(len(encoded), len(question_set), BITS_PER_ANSWER).astype(np.int8) @ weights
+    if matrix.size and matrix.max() > 5:
+        raise ValueError("Encoded answers out of range")
+    return matrix
+
+
+def to_token(data):
+    """URL-safe text form (base64url without padding) for share links, resume codes and cache keys"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def from_token(token):
+    """Bytes back from to_token output"""
+    token = token.strip()
+    try:
+        return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid response token: {e}") from None
+
+
+def encode_token(responses, questions):
+    return to_token(encode_responses(responses, questions))
+
+
+def decode_token(token):
+    return decode_responses(from_token(token))
+
+
+if __name__ == "__main__":
+    # Round-trip built-in and custom sets, and compare bulk decoding
+    from test_data import generate_test_data
+
+    responses = generate_test_data("INTJ", questions=60)["responses"]
+    data = encode_responses(responses, 60)
+    token = to_token(data)
+    print(f"60 answers: {len(data)} bytes, token {token}")
+    question_set, decoded = decode_token(token)
+    print(f"Round trip: {decoded == responses}, set {question_set.version}")
+
+    custom = [{'id': 101, 'text': 'Custom question', 'dimension': 'E'}]
+    custom_data = encode_responses({101: 5}, custom)
+    print(f"Custom set: {len(custom_data)} bytes, {decode_responses(custom_data)[1]}")
+
+    batch = [encode_responses(generate_test_data(questions=40)["responses"], 40) for _ in range(1000)]
+    matrix = decode_matrix(batch)
+    print(f"Bulk decode {matrix.shape}: {all(tuple(row) == decode_values(d)[1] for row, d in zip(matrix.tolist(), batch))}")
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+
+class LeaderAbandoned(Exception):
+    """The leader stopped without an outcome (e.g. it was cancelled); its followers try again"""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) does the work; callers that
+    arrive while it is in flight wait for the leader's result instead of
+    repeating it. Results travel through a concurrent.futures.Future, so
+    followers can wait from another thread (do) or from a coroutine on any
+    event loop (ado).
+
+    Only a leader's Exception reaches its followers. A cancelled leader
+    (or any other BaseException) just releases the key, and a cancelled
+    follower never touches the shared future.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def begin(self, key):
+        """Return (future, is_leader) for key; leaders must call end()"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def end(self, key, future, result=None, error=None):
+        """Publish the leader's outcome to every waiting follower.
+
+        An error that is not an Exception (cancellation, GeneratorExit) is
+        not passed on; followers get LeaderAbandoned and try again instead.
+        """
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None and not isinstance(error, Exception):
+            error = LeaderAbandoned(f"leader stopped with {error!r}")
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass  # already settled
+
+    def join(self, key):
+        """(future, True) when the caller leads, else (leader's result, False) once it is ready.
+
+        A follower whose leader was abandoned tries again, taking over as
+        leader if nobody else has.
+        """
+        while True:
+            future, is_leader = self.begin(key)
+            if is_leader:
+                return future, True
+            try:
+                return future.result(), False
+            except LeaderAbandoned:
+                continue
+
+    async def ajoin(self, key):
+        """Async join; cancelling the waiting coroutine leaves the shared future alone"""
+        while True:
+            future, is_leader = self.begin(key)
+            if is_leader:
+                return future, True
+            try:
+                return await asyncio.shield(asyncio.wrap_future(future)), False
+            except LeaderAbandoned:
+                continue
+
+    def do(self, key, fn):
+        outcome, is_leader = self.join(key)
+        if not is_leader:
+            return outcome
+        future = outcome
+        try:
+            result = fn()
+        except BaseException as e:
+            self.end(key, future, error=e)
+            raise
+        self.end(key, future, result)
+        return result
+
+    async def ado(self, key, coro_fn):
+        outcome, is_leader = await self.ajoin(key)
+        if not is_leader:
+            return outcome
+        future = outcome
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self.end(key, future, error=e)
+            raise
+        self.end(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+if __name__ == "__main__":
+    # Test that concurrent identical calls run once
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    flight = SingleFlight()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: flight.do("key", slow_call), range(5)))
+
+    print(f"Results: {results}")
+    print(f"Executions: {len(calls)}, stats: {flight.stats()}")
+
+    async def cancellation():
+        # A cancelled follower must not disturb the leader or the other follower
+        flight = SingleFlight()
+
+        async def slow_result():
+            await asyncio.sleep(0.1)
+            return "result"
+
+        leader = asyncio.create_task(flight.ado("key", slow_result))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.ado("key", slow_result)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+        outcomes = await asyncio.gather(leader, *followers, return_exceptions=True)
+        assert outcomes[0] == "result" and outcomes[2] == "result", outcomes
+        assert isinstance(outcomes[1], asyncio.CancelledError), outcomes
+        print(f"Cancelled follower: leader and other follower got {outcomes[0]!r}")
+
+        # A cancelled leader releases the key; a follower takes over instead of failing
+        runs = []
+
+        async def counted_result():
+            runs.append(1)
+            await asyncio.sleep(0.1)
+            return "result"
+
+        leader = asyncio.create_task(flight.ado("key", counted_result))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("key", counted_result))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        outcomes = await asyncio.gather(leader, follower, return_exceptions=True)
+        assert isinstance(outcomes[0], asyncio.CancelledError) and outcomes[1] == "result", outcomes
+        assert flight.stats()["in_flight"] == 0
+        print(f"Cancelled leader: follower took over and got {outcomes[1]!r} ({len(runs)} executions)")
+
+        # Real errors still reach followers
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        outcomes = await asyncio.gather(*(flight.ado("err", failing) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(o, ValueError) for o in outcomes), outcomes
+        print("Leader error reaches followers")
+
+    asyncio.run(cancellation())
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Base for the SQLite-backed stores (LLM cache, report index, cohort stats).
+
+    Each thread gets its own connection in WAL mode, so the app, CLI and MCP
+    server can share one file, and _count() keeps thread-safe counters for
+    stats(). Subclasses create their tables in __init__ after calling this one.
+    """
+
+    # sqlite3's default (implicit transactions); None for autocommit with explicit BEGIN
+    isolation_level = ""
+
+    def __init__(self, path, counters=()):
+        self.path = path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys(counters, 0)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
@@ -0,0 +1,253 @@
+import re
+import csv
+import json
+import functools
+import itertools
+
+try:
+    from .question_sets import get_question_set, builtin_questions_for
+    from .questionnaire import parse_submission
+    from .mbti_scoring import normalize_response
+    from .batch_scoring import responses_to_matrix, score_matrix, score_row
+    from .bootstrap import bootstrap_matrix, bootstrap_row
+except ImportError:  # run as a script
+    from question_sets import get_question_set, builtin_questions_for
+    from questionnaire import parse_submission
+    from mbti_scoring import normalize_response
+    from batch_scoring import responses_to_matrix, score_matrix, score_row
+    from bootstrap import bootstrap_matrix, bootstrap_row
+
+# Submissions scored together; bounds memory regardless of input size
+DEFAULT_CHUNK_SIZE = 1000
+
+_QUESTION_COLUMN = re.compile(r'^Q?(\d+)$', re.IGNORECASE)
+
+
+def read_jsonl(lines, source="stdin", start=1):
+    """Yield submissions from JSONL lines (numbered from start), each a JSON object or a response
+    token; unparsable lines become error records"""
+    for line_no, line in enumerate(lines, start):
+        if not line.strip():
+            continue
+        source_id = f"{source}:{line_no}"
+        try:
+            # A line is either a JSON object or a bare response token
+            data = json.loads(line) if line.lstrip().startswith('{') else {"response_code": line.strip()}
+            yield parse_submission(data, source_id)
+        except (ValueError, TypeError, AttributeError) as e:
+            yield {"id": source_id, "error": f"invalid submission: {e}"}
+
+
+def read_csv(lines, source="stdin"):
+    """Yield submissions from CSV rows with an optional id column and one column per question (Q1 or 1)"""
+    reader = csv.reader(lines)
+    return csv_submissions(next(reader, []), reader, source)
+
+
+def csv_submissions(header, rows, source="stdin", start=1):
+    """Yield submissions from parsed CSV rows (numbered from start) under the given header"""
+    id_column = header.index('id') if 'id' in header else None
+    columns = [(column, int(match.group(1))) for column, name in enumerate(header)
+               if (match := _QUESTION_COLUMN.match(name.strip()))]
+    for row_no, row in enumerate(rows, start):
+        if not row:
+            continue
+        source_id = (row[id_column] if id_column is not None and id_column < len(row) else "") \
+            or f"{source}:{row_no}"
+        responses = {}
+        for column, q_id in columns:
+            value = row[column].strip() if column < len(row) else ""
+            if value:
+                responses[q_id] = int(value) if value.lstrip('-').isdigit() else value
+        yield {"id": source_id, "questions": builtin_questions_for(responses), "responses": responses}
+
+
+def normalize_submissions(submissions):
+    """Normalize every answer to 1-5, as AnalyzeResponsesBatchNode does"""
+    for item in submissions:
+        if "error" not in item:
+            try:
+                item["responses"] = {q_id: normalize_response(r) for q_id, r in item["responses"].items()}
+            except (ValueError, TypeError) as e:
+                item = {"id": item["id"], "error": f"invalid response: {e}"}
+        yield item
+
+
+def score_submissions(submissions, chunk_size=DEFAULT_CHUNK_SIZE, bootstrap=False):
+    """Yield (submission, result) pairs in input order, scoring a chunk at a time with batch_scoring;
+    bootstrap adds each letter's flip probability and interval to confidence_scores"""
+    submissions = iter(submissions)
+    while chunk := list(itertools.islice(submissions, chunk_size)):
+        # One matrix per question set present in the chunk
+        groups = {}
+        for index, item in enumerate(chunk):
+            if "error" not in item:
+                question_set = get_question_set(item["questions"])
+                groups.setdefault(question_set.version, (question_set, []))[1].append(index)
+
+        results = [None] * len(chunk)
+        for question_set, indices in groups.values():
+            matrix = responses_to_matrix([chunk[i]["responses"] for i in indices], question_set)
+            scored = score_matrix(matrix, question_set)
+            stability = bootstrap_matrix(matrix, question_set) if bootstrap else None
+            for row, index in enumerate(indices):
+                scores, confidence, mbti_type = score_row(scored, row)
+                if stability is not None:
+                    confidence.update(bootstrap_row(stability, row))
+                results[index] = {
+                    "id": chunk[index]["id"],
+                    "mbti_type": mbti_type,
+                    "traditional_scores": scores,
+                    "confidence_scores": confidence,
+                    "answered": len(chunk[index]["responses"]),
+                }
+
+        for item, result in zip(chunk, results):
+            yield item, result or {"id": item["id"], "error": item["error"]}
+
+
+def analyze_submissions(scored, with_llm=False, with_report=False):
+    """Optionally add the LLM analysis (template fallback past LLM_DEADLINE) and an HTML report"""
+    if with_llm:
+        from .call_llm import call_llm
+        from .deadline import get_deadline, run_with_deadline
+        from .prompts import build_analysis_request, analysis_cache_key
+        from .report_generator import generate_fallback_analysis
+    if with_report:
+        from .report_generator import generate_report, build_responses_data
+
+    for item, result in scored:
+        if "error" not in result:
+            questions, responses = get_question_set(item["questions"]).questions, item["responses"]
+            mbti_type, scores = result["mbti_type"], result["traditional_scores"]
+            analysis = {"traditional_scores": scores, "confidence_scores": result["confidence_scores"]}
+
+            if with_llm:
+                prompt, system_instruction, template_version = build_analysis_request(
+                    questions, responses, mbti_type, scores)
+                cache_key = analysis_cache_key(questions, responses, mbti_type, template_version)
+                try:
+                    # Bound now: past the deadline the call may run after later items changed these names
+                    analysis["llm_analysis"] = run_with_deadline(
+                        functools.partial(call_llm, prompt, cache_key=cache_key, system_instruction=system_instruction),
+                        get_deadline())
+                    result["llm_fallback"] = False
+                except Exception as e:
+                    print(f"LLM analysis unavailable for {result['id']} ({e!r}), using template analysis")
+                    analysis["llm_analysis"] = generate_fallback_analysis(questions, responses, mbti_type, scores)
+                    result["llm_fallback"] = True
+                result["llm_analysis"] = analysis["llm_analysis"]
+
+            if with_report:
+                analysis["responses_data"] = build_responses_data(questions, responses)
+                safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(result["id"]))
+                result["report_path"] = generate_report(mbti_type, analysis, "html",
+                                                        filename=f"mbti_report_{safe_id}_{mbti_type}.html")
+        yield item, result
+
+
+def write_jsonl(scored, out):
+    """Write one JSON result per line, flushing each so downstream tools see it immediately"""
+    for _, result in scored:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        yield result
+
+
+def score_stream(lines, out, fmt="jsonl", source="stdin", with_llm=False, with_report=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE, bootstrap=False):
+    """Read, normalize, score, optionally analyze and write submissions, yielding each result"""
+    reader = read_csv if fmt == "csv" else read_jsonl
+    pipeline = score_submissions(normalize_submissions(reader(lines, source)), chunk_size, bootstrap)
+    if with_llm or with_report:
+        pipeline = analyze_submissions(pipeline, with_llm, with_report)
+    return write_jsonl(pipeline, out)
+
+
+# Process-pool execution: the parent only splits the input into chunks of raw
+# lines (or CSV rows) and writes the JSONL text each worker sends back, so
+# parsing, scoring, analysis and serialisation all run in the workers
+
+_worker_options = None
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+    if options["with_llm"]:
+        # Each process has its own limiter; split the quota so the pool stays within it
+        import os
+        try:
+            from .rate_limiter import DEFAULT_RPM, DEFAULT_TPM
+        except ImportError:  # run as a script
+            from rate_limiter import DEFAULT_RPM, DEFAULT_TPM
+        for name, default in (("LLM_RPM", DEFAULT_RPM), ("LLM_TPM", DEFAULT_TPM)):
+            os.environ[name] = str(float(os.getenv(name, default)) / options["workers"])
+
+
+def _score_chunk(chunk):
+    """Run the whole pipeline over one chunk, returning (jsonl_text, count, invalid)"""
+    records, start = chunk
+    options = _worker_options
+    if options["fmt"] == "csv":
+        submissions = csv_submissions(options["header"], records, options["source"], start)
+    else:
+        submissions = read_jsonl(records, options["source"], start)
+    pipeline = score_submissions(normalize_submissions(submissions), len(records), options["bootstrap"])
+    if options["with_llm"] or options["with_report"]:
+        pipeline = analyze_submissions(pipeline, options["with_llm"], options["with_report"])
+
+    lines, invalid = [], 0
+    for _, result in pipeline:
+        invalid += "error" in result
+        lines.append(json.dumps(result, ensure_ascii=False) + "\n")
+    return "".join(lines), len(lines), invalid
+
+
+def score_stream_parallel(lines, out, fmt="jsonl", source="stdin", with_llm=False, with_report=False,
+                          chunk_size=DEFAULT_CHUNK_SIZE, workers=2, bootstrap=False):
+    """score_stream across a pool of worker processes, yielding (count, invalid) per chunk.
+
+    Chunks are record-count shards of the input; at most 2 per worker are in
+    flight, so memory stays bounded, and results are written in input order.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    options = {"fmt": fmt, "source": source, "with_llm": with_llm, "with_report": with_report,
+               "workers": workers, "bootstrap": bootstrap, "header": None}
+    if fmt == "csv":
+        lines = csv.reader(lines)
+        options["header"] = next(lines, [])
+    else:
+        lines = iter(lines)
+    start = 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                records = list(itertools.islice(lines, chunk_size))
+                if not records:
+                    break
+                pending.append(pool.submit(_score_chunk, (records, start)))
+                start += len(records)
+            if not pending:
+                return
+            text, count, invalid = pending.popleft().result()
+            out.write(text)
+            out.flush()
+            yield count, invalid
+
+
+if __name__ == "__main__":
+    # Score a few generated submissions from memory
+    import io
+    from test_data import generate_test_data
+
+    lines = [json.dumps({"id": f"t{i}", "responses": generate_test_data("INTJ", questions=40)["responses"]})
+             for i in range(3)]
+    lines.append("not json")
+    out = io.StringIO()
+    for result in score_stream(lines, out):
+        print(result.get("mbti_type", result.get("error")), result.get("answered"))
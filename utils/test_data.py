@@ -1,5 +1,10 @@
 import random
 
+try:
+    from .question_sets import get_question_set
+except ImportError:  # run as a script
+    from question_sets import get_question_set
+
 # MBTI type response patterns for generating test data
 MBTI_PATTERNS = {
     "INTJ": {
@@ -20,17 +25,11 @@ MBTI_PATTERNS = {
     }
 }
 
-def generate_test_data(mbti_type=None, count=1):
-    """Generate test questionnaire responses"""
-    
-    # Import actual question dimensions
-    import sys
-    import os
-    sys.path.append(os.path.dirname(__file__))
-    from questionnaire import load_questionnaire
+def generate_test_data(mbti_type=None, count=1, questions=20):
+    """Generate test questionnaire responses for a question set (QuestionSet, list or built-in length)"""
     
-    questions = load_questionnaire()
-    question_dimensions = {q['id']: q['dimension'] for q in questions}
+    # Actual question dimensions from the question set registry
+    question_dimensions = get_question_set(questions).dimension_of
     
     results = []
     